@@ -0,0 +1,49 @@
+import os
+import time
+
+from redis import Redis
+
+from cache import Cache
+
+BATCH_SIZES = [1, 10, 50, 100, 500, 1000, 5000]
+ROUNDS = 20
+TTL = 60
+
+host = os.getenv("REDIS_HOST") if os.getenv("REDIS_HOST") else "localhost"
+client = Redis(host, port=6379, decode_responses=True)
+cache = Cache(client)
+
+
+def measure(func, *args):
+    """
+    重复执行给定函数ROUNDS次，返回每次执行的平均耗时，单位为毫秒。
+    """
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        func(*args)
+    return (time.perf_counter() - start) / ROUNDS * 1000
+
+
+def set_loop(mapping, ttl):
+    for name, content in mapping.items():
+        cache.set(name, content, ttl)
+
+
+def get_loop(names):
+    return [cache.get(name) for name in names]
+
+
+print(f"{'batch':>6} {'set loop':>10} {'set_many':>10} {'get loop':>10} {'get_many':>10}  (ms)")
+for size in BATCH_SIZES:
+    mapping = {f"Bench:Fragment:{i}": "<p>fragment {}</p>".format(i) for i in range(size)}
+    names = list(mapping)
+
+    set_loop_ms = measure(set_loop, mapping, TTL)
+    set_many_ms = measure(cache.set_many, mapping, TTL)
+    get_loop_ms = measure(get_loop, names)
+    get_many_ms = measure(cache.get_many, names)
+    assert cache.get_many(names) == get_loop(names)
+
+    print(f"{size:>6} {set_loop_ms:>10.3f} {set_many_ms:>10.3f} {get_loop_ms:>10.3f} {get_many_ms:>10.3f}")
+
+    client.delete(*names)
@@ -1,20 +1,253 @@
+import math
+import random
+import secrets
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import batched
+
+from cache_metrics import get_metrics, size_of
+
+# 单次MGET/MSET或单个流水线中最多包含的键数量，避免超大批次阻塞Redis
+BATCH_SIZE = 1000
+
+# 跨进程重建缓存时使用的锁的最大加锁时长，单位为毫秒
+COMPUTE_LOCK_TIMEOUT = 10000
+# 未抢到锁的进程轮询缓存的间隔，单位为秒
+COMPUTE_POLL_INTERVAL = 0.05
+# XFetch算法的默认beta参数，值越大越倾向于提前重建缓存
+DEFAULT_BETA = 1.0
+# 在后台刷新过期旧值的线程数量
+REFRESH_WORKERS = 4
+
+# 负缓存的标记值，表示数据源中确实没有对应的数据
+NEGATIVE_CONTENT = "\x00CacheNegative\x00"
+NEGATIVE_CONTENTS = (NEGATIVE_CONTENT, NEGATIVE_CONTENT.encode())
+
+# 仅当锁的值仍然是自己设置的令牌时才删除锁
+RELEASE_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+
+def make_lock_key(name):
+    """
+    构建重建指定缓存时使用的锁键。
+    例子：CacheLock:10086
+    """
+    return "CacheLock:{}".format(name)
+
+
+def make_delta_key(name):
+    """
+    构建记录指定缓存重建耗时的键。
+    例子：CacheDelta:10086
+    """
+    return "CacheDelta:{}".format(name)
+
+
 class Cache:
 
-    def __init__(self, client):
+    def __init__(self, client, namespace="Cache"):
+        """
+        创建一个缓存对象。
+        可选的namespace参数用于指定统计指标所属的命名空间，
+        相同命名空间的缓存对象共享同一组指标。
+        """
         self.client = client
+        self.metrics = get_metrics(namespace)
+        # 缓存名字 -> 正在进行的重建任务，用于合并同一进程内的并发重建
+        self.flights = {}
+        self.flights_lock = threading.Lock()
+        self.release_script = client.register_script(RELEASE_SCRIPT)
+        # 用于在后台刷新过期旧值的线程池，首次使用时才创建
+        self.refresher = None
 
     def set(self, name, content, ttl=None):
         """
         为指定名字的缓存设置内容。
         可选的ttl参数用于设置缓存的生存时间。
         """
+        start = time.perf_counter()
         if ttl is None:
             self.client.set(name, content)
         else:
             self.client.set(name, content, ex=ttl)
+        self.metrics.observe_set(1, size_of(content), time.perf_counter() - start)
 
     def get(self, name):
         """
         尝试获取指定名字的缓存内容，若缓存不存在则返回None。
         """
-        return self.client.get(name)
+        start = time.perf_counter()
+        content = self.client.get(name)
+        self._observe_get([content], time.perf_counter() - start)
+        return None if content in NEGATIVE_CONTENTS else content
+
+    def set_many(self, mapping, ttl=None):
+        """
+        为多个名字的缓存一次性设置内容，mapping为名字到内容的映射。
+        可选的ttl参数用于为所有缓存设置相同的生存时间。
+        """
+        start = time.perf_counter()
+        for chunk in batched(mapping.items(), BATCH_SIZE):
+            if ttl is None:
+                self.client.mset(dict(chunk))
+            else:
+                # MSET不支持设置生存时间，改为在流水线中批量发送SET EX
+                tx = self.client.pipeline(transaction=False)
+                for name, content in chunk:
+                    tx.set(name, content, ex=ttl)
+                tx.execute()
+        nbytes = sum(size_of(content) for content in mapping.values())
+        self.metrics.observe_set(len(mapping), nbytes, time.perf_counter() - start)
+
+    def get_many(self, names):
+        """
+        按照给定名字的顺序返回多个缓存的内容，不存在的缓存对应的结果为None。
+        """
+        start = time.perf_counter()
+        contents = []
+        for chunk in batched(names, BATCH_SIZE):
+            contents.extend(self.client.mget(chunk))
+        self._observe_get(contents, time.perf_counter() - start)
+        return [None if content in NEGATIVE_CONTENTS else content for content in contents]
+
+    def stats(self):
+        """
+        返回本缓存所属命名空间的统计指标快照，
+        包括命中、未命中、写入次数，读写字节数，序列化耗时以及读写延迟分布。
+        """
+        return self.metrics.snapshot()
+
+    def get_or_compute(
+        self,
+        name,
+        loader,
+        ttl=None,
+        beta=DEFAULT_BETA,
+        soft_ttl=None,
+        negative_ttl=None,
+    ):
+        """
+        尝试获取指定名字的缓存内容，缓存不存在时调用loader重建缓存并返回结果。
+        同一进程内的并发重建会被合并为一次，多个进程之间则通过锁保证只有一个进程执行重建，
+        其他调用者将得到获胜者重建的结果。
+        设置了ttl时，缓存临近过期前会按照XFetch算法以一定概率提前重建，
+        beta参数用于调节提前重建的积极程度。
+        soft_ttl应小于ttl，缓存写入超过soft_ttl秒之后即被视为过期旧值：
+        此时直接返回旧值，同时在后台刷新缓存，调用者无需等待重建。
+        loader返回None时，如果设置了negative_ttl，那么会在这段时间内缓存“数据不存在”这一结果，
+        期间的调用直接返回None而不会再次调用loader。
+        """
+        start = time.perf_counter()
+        content, delta, pttl = self._fetch(name)
+        self._observe_get([content], time.perf_counter() - start)
+        if content in NEGATIVE_CONTENTS:
+            return None
+        if content is not None:
+            if soft_ttl is not None and ttl is not None and 0 <= pttl <= (ttl - soft_ttl) * 1000:
+                # 旧值已经过了软过期时间：立即返回旧值，由后台线程刷新缓存
+                self._refresh_in_background(name, loader, ttl, negative_ttl, content)
+                return content
+            if not self._should_refresh(delta, pttl, beta):
+                return content
+
+        with self.flights_lock:
+            flight = self.flights.get(name)
+            is_leader = flight is None
+            if is_leader:
+                flight = self.flights[name] = Future()
+
+        if not is_leader:
+            # 已经有线程在重建：旧值仍然有效就直接使用，否则等待重建结果
+            if content is not None:
+                return content
+            return flight.result()
+
+        self._run_flight(flight, name, loader, ttl, negative_ttl, content)
+        return flight.result()
+
+    def _run_flight(self, flight, name, loader, ttl, negative_ttl, content):
+        try:
+            flight.set_result(self._compute(name, loader, ttl, negative_ttl, content))
+        except BaseException as error:
+            flight.set_exception(error)
+        finally:
+            with self.flights_lock:
+                del self.flights[name]
+
+    def _refresh_in_background(self, name, loader, ttl, negative_ttl, content):
+        with self.flights_lock:
+            if name in self.flights:
+                # 已经有线程在刷新这个缓存
+                return
+            flight = self.flights[name] = Future()
+            if self.refresher is None:
+                self.refresher = ThreadPoolExecutor(REFRESH_WORKERS, thread_name_prefix="cache-refresh")
+        self.refresher.submit(self._run_flight, flight, name, loader, ttl, negative_ttl, content)
+
+    def _observe_get(self, contents, seconds):
+        hits = sum(1 for content in contents if content is not None)
+        nbytes = sum(size_of(content) for content in contents)
+        self.metrics.observe_get(hits, len(contents) - hits, nbytes, seconds)
+
+    def _fetch(self, name):
+        # 在一次往返中取出缓存内容、上次重建耗时以及剩余生存时间
+        tx = self.client.pipeline(transaction=False)
+        tx.get(name)
+        tx.get(make_delta_key(name))
+        tx.pttl(name)
+        content, delta, pttl = tx.execute()
+        return content, None if delta is None else float(delta), pttl
+
+    def _should_refresh(self, delta, pttl, beta):
+        # XFetch：剩余时间越短、重建越耗时，提前重建的概率就越高
+        if delta is None or pttl < 0:
+            return False
+        return -delta * beta * math.log(1 - random.random()) * 1000 >= pttl
+
+    def _compute(self, name, loader, ttl, negative_ttl, content):
+        lock_key = make_lock_key(name)
+        token = secrets.token_hex(16)
+        deadline = time.monotonic() + COMPUTE_LOCK_TIMEOUT / 1000
+        while not self.client.set(lock_key, token, nx=True, px=COMPUTE_LOCK_TIMEOUT):
+            # 其他进程正在重建：有旧值就继续使用旧值，否则等待对方写入的新值
+            if content is not None:
+                return content
+            time.sleep(COMPUTE_POLL_INTERVAL)
+            fresh = self.client.get(name)
+            if fresh is not None:
+                return None if fresh in NEGATIVE_CONTENTS else fresh
+            if time.monotonic() >= deadline:
+                # 持有锁的进程迟迟没有完成重建，放弃等待并自行重建
+                return self._load(name, loader, ttl, negative_ttl)
+        try:
+            return self._load(name, loader, ttl, negative_ttl)
+        finally:
+            self.release_script(keys=[lock_key], args=[token])
+
+    def _load(self, name, loader, ttl, negative_ttl):
+        start = time.monotonic()
+        content = loader()
+        delta = time.monotonic() - start
+        tx = self.client.pipeline(transaction=False)
+        if content is None:
+            # 数据源中没有数据：按需写入负缓存，否则不缓存任何内容
+            if negative_ttl is not None:
+                tx.set(name, NEGATIVE_CONTENT, ex=negative_ttl)
+                tx.delete(make_delta_key(name))
+                tx.execute()
+            return None
+        if ttl is None:
+            tx.set(name, content)
+            tx.delete(make_delta_key(name))
+        else:
+            tx.set(name, content, ex=ttl)
+            tx.set(make_delta_key(name), delta, ex=ttl)
+        tx.execute()
+        self.metrics.observe_set(1, size_of(content), time.monotonic() - start - delta)
+        return content
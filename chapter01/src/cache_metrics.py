@@ -0,0 +1,189 @@
+import threading
+
+# 直方图每个2的幂区间被划分为的子桶数量的对数，6表示相对误差不超过约3%
+SUB_BUCKET_BITS = 6
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+SUB_BUCKET_HALF = SUB_BUCKET_COUNT // 2
+
+PERCENTILES = [50, 90, 99, 99.9]
+
+COUNTERS = [
+    "hits",
+    "misses",
+    "sets",
+    "bytes_read",
+    "bytes_written",
+    "serialize_seconds",
+    "deserialize_seconds",
+]
+
+# 命名空间 -> 指标，相同命名空间的缓存对象共享同一组指标
+METRICS = {}
+METRICS_LOCK = threading.Lock()
+
+
+def size_of(content):
+    """
+    粗略估计缓存内容的字节数，字符串按照字符数计算以避免额外的编码开销。
+    """
+    if content is None:
+        return 0
+    if isinstance(content, memoryview):
+        return content.nbytes
+    if isinstance(content, (bytes, bytearray, str)):
+        return len(content)
+    return len(str(content))
+
+
+class LatencyHistogram:
+
+    def __init__(self):
+        """
+        创建一个HDR风格的对数线性直方图，以微秒为单位记录耗时。
+        每个2的幂区间被均匀划分为多个子桶，因此记录一次耗时只需要几次整数运算。
+        """
+        self.buckets = [0] * SUB_BUCKET_COUNT
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, seconds):
+        """
+        记录一次耗时，单位为秒。
+        """
+        value = int(seconds * 1000000)
+        shift = max(value.bit_length() - SUB_BUCKET_BITS, 0)
+        index = shift * SUB_BUCKET_HALF + (value >> shift)
+        if index >= len(self.buckets):
+            self.buckets.extend([0] * (index + 1 - len(self.buckets)))
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, p):
+        """
+        返回第p百分位的耗时上界，单位为秒；直方图为空时返回0。
+        """
+        if self.count == 0:
+            return 0
+        rank = self.count * p / 100
+        seen = 0
+        for index, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= rank:
+                return min(self._upper_bound(index), self.max) / 1000000
+        return self.max / 1000000
+
+    def snapshot(self):
+        """
+        返回包含次数、平均值、最大值以及各百分位耗时的字典，单位为秒。
+        """
+        result = {
+            "count": self.count,
+            "sum": self.total / 1000000,
+            "mean": self.total / self.count / 1000000 if self.count else 0,
+            "max": self.max / 1000000,
+        }
+        for p in PERCENTILES:
+            result["p{}".format(p)] = self.percentile(p)
+        return result
+
+    def _upper_bound(self, index):
+        if index < SUB_BUCKET_COUNT:
+            return index
+        shift = (index - SUB_BUCKET_COUNT) // SUB_BUCKET_HALF + 1
+        low = (index - shift * SUB_BUCKET_HALF) << shift
+        return low + (1 << shift) - 1
+
+
+class CacheMetrics:
+
+    def __init__(self, namespace):
+        """
+        创建记录一个缓存命名空间的计数器和延迟直方图的指标对象。
+        """
+        self.namespace = namespace
+        self.lock = threading.Lock()
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.latencies = {"get": LatencyHistogram(), "set": LatencyHistogram()}
+
+    def observe_get(self, hits, misses, nbytes, seconds):
+        """
+        记录一次读取操作的命中数、未命中数、读取字节数和耗时。
+        """
+        with self.lock:
+            self.counters["hits"] += hits
+            self.counters["misses"] += misses
+            self.counters["bytes_read"] += nbytes
+            self.latencies["get"].record(seconds)
+
+    def observe_set(self, sets, nbytes, seconds):
+        """
+        记录一次写入操作写入的缓存数量、字节数和耗时。
+        """
+        with self.lock:
+            self.counters["sets"] += sets
+            self.counters["bytes_written"] += nbytes
+            self.latencies["set"].record(seconds)
+
+    def observe_serialize(self, seconds, decode=False):
+        """
+        记录一次序列化（decode为True时则是反序列化）的耗时。
+        """
+        name = "deserialize_seconds" if decode else "serialize_seconds"
+        with self.lock:
+            self.counters[name] += seconds
+
+    def snapshot(self):
+        """
+        返回当前所有计数器以及各操作延迟分布的快照。
+        """
+        with self.lock:
+            result = dict(self.counters)
+            lookups = result["hits"] + result["misses"]
+            result["hit_ratio"] = result["hits"] / lookups if lookups else 0
+            result["latency"] = {op: h.snapshot() for op, h in self.latencies.items()}
+        return result
+
+
+def get_metrics(namespace):
+    """
+    返回指定命名空间的指标对象，不存在时自动创建。
+    """
+    with METRICS_LOCK:
+        metrics = METRICS.get(namespace)
+        if metrics is None:
+            metrics = METRICS[namespace] = CacheMetrics(namespace)
+        return metrics
+
+
+def export_prometheus():
+    """
+    以Prometheus文本格式导出所有命名空间的指标。
+    """
+    with METRICS_LOCK:
+        snapshots = {namespace: m.snapshot() for namespace, m in METRICS.items()}
+
+    lines = []
+    for name in COUNTERS:
+        metric = "cache_{}_total".format(name)
+        lines.append("# TYPE {} counter".format(metric))
+        for namespace, snapshot in snapshots.items():
+            lines.append('{}{{namespace="{}"}} {}'.format(metric, namespace, snapshot[name]))
+
+    lines.append("# TYPE cache_latency_seconds summary")
+    for namespace, snapshot in snapshots.items():
+        for op, latency in snapshot["latency"].items():
+            labels = 'namespace="{}",op="{}"'.format(namespace, op)
+            for p in PERCENTILES:
+                lines.append(
+                    'cache_latency_seconds{{{},quantile="{}"}} {}'.format(
+                        labels, "{:g}".format(p / 100), latency["p{}".format(p)]
+                    )
+                )
+            lines.append("cache_latency_seconds_sum{{{}}} {}".format(labels, latency["sum"]))
+            lines.append("cache_latency_seconds_count{{{}}} {}".format(labels, latency["count"]))
+    return "\n".join(lines) + "\n"
+
@@ -1,4 +1,5 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 from redis import Redis
 from cache import Cache
@@ -33,3 +34,32 @@ for _ in range(REQUEST_TIMES):
     else:
         # 缓存存在，无需访问数据库也无需生成HTML页面
         print("Fetch post from cache.")
+
+# 缓存过期后，并发的请求只会触发一次页面生成，其余请求等待并共享生成结果
+client.delete(ID)
+loads = []
+
+
+def load_post():
+    loads.append(ID)
+    return get_post_from_template(ID)
+
+
+with ThreadPoolExecutor(REQUEST_TIMES) as executor:
+    posts = list(executor.map(lambda _: cache.get_or_compute(ID, load_post, TTL), range(REQUEST_TIMES)))
+print("Fetch post from database&template {} time(s) for {} concurrent requests.".format(len(loads), len(posts)))
+
+# 数据库中不存在的页面：结果被负缓存，之后的请求不再访问数据库
+MISSING_ID = 404
+client.delete(MISSING_ID)
+loads.clear()
+
+
+def load_missing_post():
+    loads.append(MISSING_ID)
+    return None
+
+
+for _ in range(REQUEST_TIMES):
+    assert cache.get_or_compute(MISSING_ID, load_missing_post, TTL, negative_ttl=5) is None
+print("Query database {} time(s) for {} requests of a missing post.".format(len(loads), REQUEST_TIMES))
@@ -0,0 +1,126 @@
+import json
+import pickle
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# 各编码格式写在值开头的标记字节
+# 这些字节都不会出现在JSON文本的开头，因此可以和未带标记的旧值区分开
+# JSON格式写入时不带标记，以便尚未升级、只能读取JSON的旧版本读者继续读取新写入的值，
+# TAG_JSON只用于读取曾经以带标记的形式写入的JSON数据
+TAG_JSON = 0x01
+TAG_ORJSON = 0x02
+TAG_MSGPACK = 0x03
+TAG_PICKLE5 = 0x04
+
+# 名字 -> 编解码器
+CODECS = {}
+# 标记字节 -> 编解码器
+CODECS_BY_TAG = {}
+
+
+class Codec:
+
+    def __init__(self, name, tag, dumps, loads, safe=True, tagged=True):
+        """
+        创建一个编解码器。
+        dumps负责把对象编码为bytes，loads负责把bytes解码为对象，
+        tag则是写在编码结果开头、用于在解码时识别格式的单个字节。
+        safe为False表示解码过程可以执行任意代码，这样的格式只有在调用者明确允许时才会被解码；
+        tagged为False表示编码结果不带标记字节，即与旧版本兼容的JSON文本。
+        """
+        self.name = name
+        self.tag = tag
+        self.dumps = dumps
+        self.loads = loads
+        self.safe = safe
+        self.tagged = tagged
+
+    def encode(self, content):
+        """
+        编码给定对象，并在结果开头加上本编解码器的标记字节。
+        """
+        if not self.tagged:
+            return self.dumps(content)
+        return bytes([self.tag]) + self.dumps(content)
+
+
+def register_codec(codec):
+    """
+    注册一个编解码器，之后即可通过名字使用它，并能解码带有它的标记字节的数据。
+    """
+    if codec.tag in CODECS_BY_TAG:
+        raise ValueError("Tag {} is already registered!".format(codec.tag))
+    CODECS[codec.name] = codec
+    CODECS_BY_TAG[codec.tag] = codec
+
+
+def get_codec(name):
+    """
+    返回指定名字的编解码器，名字未注册（例如依赖的库没有安装）时抛出ValueError。
+    """
+    codec = CODECS.get(name)
+    if codec is None:
+        raise ValueError("Codec '{}' is not available!".format(name))
+    return codec
+
+
+def readable_codecs(codec, allow_unsafe=False):
+    """
+    返回使用给定编解码器的缓存可以读取的编解码器名字集合：
+    给定的编解码器本身以及全部不会执行代码的格式，
+    解码时可能执行任意代码的格式（例如pickle5）只有在allow_unsafe为True时才会被包括在内。
+    """
+    return {
+        name for name, other in CODECS.items()
+        if other is codec or other.safe or allow_unsafe
+    }
+
+
+def decode(data, allowed=None):
+    """
+    根据开头的标记字节选择编解码器解码给定数据。
+    没有标记字节的数据被视为旧版本写入的JSON文本。
+    allowed为允许使用的编解码器名字集合，默认只允许不会执行代码的格式；
+    数据的标记字节对应的格式不在其中时抛出ValueError，
+    以免能够写入缓存的人通过伪造的数据在读者的进程中执行代码。
+    """
+    if isinstance(data, str):
+        # 客户端开启了decode_responses，文本格式的数据会以字符串形式返回
+        data = data.encode()
+    codec = CODECS_BY_TAG.get(data[0]) if data else None
+    if codec is None:
+        return json.loads(data)
+    permitted = codec.safe if allowed is None else codec.name in allowed
+    if not permitted:
+        raise ValueError("Codec '{}' is not allowed for this cache!".format(codec.name))
+    return codec.loads(data[1:])
+
+
+register_codec(
+    Codec("json", TAG_JSON, lambda content: json.dumps(content).encode(), json.loads, tagged=False)
+)
+
+# pickle只应该用于解码可信的数据，因为解码过程可以执行任意代码
+register_codec(
+    Codec(
+        "pickle5",
+        TAG_PICKLE5,
+        lambda content: pickle.dumps(content, protocol=5),
+        pickle.loads,
+        safe=False,
+    )
+)
+
+if orjson is not None:
+    register_codec(Codec("orjson", TAG_ORJSON, orjson.dumps, orjson.loads))
+
+if msgpack is not None:
+    register_codec(Codec("msgpack", TAG_MSGPACK, msgpack.packb, msgpack.unpackb))
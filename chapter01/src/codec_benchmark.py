@@ -0,0 +1,58 @@
+import os
+import random
+import time
+
+from redis import Redis
+
+from codec import CODECS, decode
+from json_cache import JsonCache
+
+RECORDS = 1000
+ROUNDS = 5
+
+host = os.getenv("REDIS_HOST") if os.getenv("REDIS_HOST") else "localhost"
+client = Redis(host, port=6379)
+
+
+def make_user(uid):
+    """
+    模拟一条比User:10086更完整的用户记录。
+    """
+    return {
+        "id": uid,
+        "name": "User{}".format(uid),
+        "gender": random.choice(["male", "female"]),
+        "age": random.randint(18, 80),
+        "email": "user{}@example.com".format(uid),
+        "tags": random.sample(["redis", "python", "cache", "music", "travel", "food"], 3),
+        "score": random.random() * 100,
+        "verified": random.random() < 0.5,
+        "address": {"city": "Guangzhou", "street": "No.{} Road".format(uid % 100)},
+        "friends": [random.randint(10000, 99999) for _ in range(20)],
+    }
+
+
+users = [make_user(10086 + i) for i in range(RECORDS)]
+
+print(f"{'codec':>8} {'encode/s':>12} {'decode/s':>12} {'bytes':>8} {'memory':>8}")
+for name, codec in CODECS.items():
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        encoded = [codec.encode(user) for user in users]
+    encode_rate = RECORDS * ROUNDS / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        decoded = [decode(data, set(CODECS)) for data in encoded]
+    decode_rate = RECORDS * ROUNDS / (time.perf_counter() - start)
+    assert decoded[0]["id"] == users[0]["id"]
+
+    # 实际写入Redis，对比每条记录占用的字节数和内存
+    cache = JsonCache(client, codec=name)
+    names = ["Bench:User:{}".format(user["id"]) for user in users]
+    cache.set_many(dict(zip(names, users)))
+    stored = sum(client.strlen(key) for key in names) / RECORDS
+    memory = sum(client.memory_usage(key) for key in names) / RECORDS
+    client.delete(*names)
+
+    print(f"{name:>8} {encode_rate:>12.0f} {decode_rate:>12.0f} {stored:>8.1f} {memory:>8.1f}")
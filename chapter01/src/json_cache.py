@@ -1,26 +1,72 @@
-import json
+import time
+
 from cache import Cache
+from codec import decode, get_codec, readable_codecs
 
 class JsonCache:
 
-    def __init__(self, client):
-        self.cache = Cache(client)
+    def __init__(self, client, codec="json", namespace="JsonCache", allow_pickle=False):
+        """
+        创建一个缓存结构化数据的缓存对象。
+        可选的codec参数用于指定编码格式，可以是'json'、'orjson'、'msgpack'或'pickle5'，
+        其中'msgpack'和'pickle5'会产生二进制数据，需要使用未开启decode_responses的客户端。
+        以其他不会执行代码的格式写入的缓存都能被正确读取；
+        pickle5格式的缓存只有在codec为'pickle5'或者allow_pickle为True时才会被读取，
+        否则读取时抛出ValueError，因为解码伪造的pickle数据可以执行任意代码。
+        可选的namespace参数用于指定统计指标所属的命名空间。
+        """
+        self.cache = Cache(client, namespace)
+        self.codec = get_codec(codec)
+        self.readable = readable_codecs(self.codec, allow_pickle)
 
     def set(self, name, content, ttl=None):
         """
         为指定名字的缓存设置内容。
         可选的ttl参数用于设置缓存的生存时间。
         """
-        json_data = json.dumps(content)
-        self.cache.set(name, json_data, ttl)
+        start = time.perf_counter()
+        data = self.codec.encode(content)
+        self.cache.metrics.observe_serialize(time.perf_counter() - start)
+        self.cache.set(name, data, ttl)
 
     def get(self, name):
         """
         尝试获取指定名字的缓存内容，若缓存不存在则返回None。
         """
-        json_data = self.cache.get(name)
-        if json_data is not None:
-            return json.loads(json_data)
+        data = self.cache.get(name)
+        if data is not None:
+            return self._decode(data)
+
+    def set_many(self, mapping, ttl=None):
+        """
+        为多个名字的缓存一次性设置内容，mapping为名字到内容的映射。
+        可选的ttl参数用于为所有缓存设置相同的生存时间。
+        """
+        start = time.perf_counter()
+        encoded = {name: self.codec.encode(content) for name, content in mapping.items()}
+        self.cache.metrics.observe_serialize(time.perf_counter() - start)
+        self.cache.set_many(encoded, ttl)
+
+    def get_many(self, names):
+        """
+        按照给定名字的顺序返回多个缓存的内容，不存在的缓存对应的结果为None。
+        """
+        return [
+            None if data is None else self._decode(data)
+            for data in self.cache.get_many(names)
+        ]
+
+    def stats(self):
+        """
+        返回本缓存所属命名空间的统计指标快照。
+        """
+        return self.cache.stats()
+
+    def _decode(self, data):
+        start = time.perf_counter()
+        content = decode(data, self.readable)
+        self.cache.metrics.observe_serialize(time.perf_counter() - start, decode=True)
+        return content
 
 if __name__ == "__main__":
   import os
@@ -35,3 +81,25 @@ if __name__ == "__main__":
   data = {"id":10086,"name":"Peter","gender":"male","age":56}
   cache.set("User:10086", data) # 缓存数据
   print(cache.get("User:10086")) # 获取缓存数据
+
+  users = {"User:10087": {"id":10087,"name":"Jack"}, "User:10088": {"id":10088,"name":"Tom"}}
+  cache.set_many(users, 60) # 批量缓存数据
+  print(cache.get_many(["User:10087", "User:10086", "User:404", "User:10088"])) # 批量获取缓存数据
+
+  binary_cache = JsonCache(Redis(host, port=6379), codec="pickle5") # 以pickle格式缓存数据
+  assert binary_cache.get("User:10086") == data # 仍然可以读取以JSON格式写入的数据
+  binary_cache.set("User:10086", data)
+  assert binary_cache.get("User:10086") == data
+
+  # 默认的JSON缓存拒绝解码pickle数据，避免伪造的缓存值在读者的进程中执行代码
+  try:
+    JsonCache(Redis(host, port=6379)).get("User:10086")
+  except ValueError:
+    pass
+  else:
+    raise AssertionError("pickle data must not be decoded without opting in")
+  assert JsonCache(Redis(host, port=6379), allow_pickle=True).get("User:10086") == data
+
+  from cache_metrics import export_prometheus
+  print(cache.stats())
+  print(export_prometheus())
@@ -0,0 +1,121 @@
+import time
+
+from cache import Cache
+
+# 本地缓存的代数的有效时长，单位为秒
+# 其他进程执行invalidate()之后，最多经过这么长时间本进程就会改用新的代数
+DEFAULT_REFRESH_INTERVAL = 1
+
+
+def make_generation_key(namespace):
+    """
+    构建记录命名空间当前代数的键。
+    例子：CacheNamespace:posts
+    """
+    return "CacheNamespace:{}".format(namespace)
+
+
+class NamespacedCache:
+
+    def __init__(self, client, namespace, cache=None, refresh_interval=DEFAULT_REFRESH_INTERVAL):
+        """
+        创建一个带有命名空间的缓存对象，命名空间内的所有缓存可以通过invalidate()一次性失效。
+        可选的cache参数用于指定实际存储数据的缓存对象，默认使用Cache，
+        它必须提供与Cache相同的set(name, content, ttl)、get、set_many和get_many方法，例如JsonCache；
+        BinaryCache的set()接受的是文件路径，并且没有批量方法，因此不能被包装，
+        需要时可以通过key()取得当前代数下的键再直接调用BinaryCache。
+        refresh_interval用于设置本地缓存的代数的有效时长。
+        """
+        self.client = client
+        self.namespace = namespace
+        self.cache = Cache(client) if cache is None else cache
+        self.refresh_interval = refresh_interval
+        self.generation_key = make_generation_key(namespace)
+        self.generation = None
+        self.expire_at = 0
+
+    def key(self, name):
+        """
+        返回给定名字在当前代数下实际使用的键，
+        可以用于调用被包装的缓存对象的其他方法，或者直接使用BinaryCache等无法被包装的缓存对象。
+        例子：posts:v3:10086
+        """
+        return self._make_key(self._current_generation(), name)
+
+    def set(self, name, content, ttl=None):
+        """
+        为指定名字的缓存设置内容。
+        可选的ttl参数用于设置缓存的生存时间，
+        失效之后旧代数下的缓存不会再被访问，只能依靠ttl过期，因此建议总是设置ttl。
+        """
+        self.cache.set(self.key(name), content, ttl)
+
+    def get(self, name):
+        """
+        尝试获取指定名字的缓存内容，若缓存不存在则返回None。
+        """
+        return self.cache.get(self.key(name))
+
+    def set_many(self, mapping, ttl=None):
+        """
+        为多个名字的缓存一次性设置内容，mapping为名字到内容的映射。
+        """
+        generation = self._current_generation()
+        self.cache.set_many(
+            {self._make_key(generation, name): content for name, content in mapping.items()},
+            ttl,
+        )
+
+    def get_many(self, names):
+        """
+        按照给定名字的顺序返回多个缓存的内容，不存在的缓存对应的结果为None。
+        """
+        generation = self._current_generation()
+        return self.cache.get_many([self._make_key(generation, name) for name in names])
+
+    def invalidate(self):
+        """
+        使命名空间内已有的全部缓存失效，并返回新的代数。
+        这个操作只需要执行一次INCR，旧的缓存会在生存时间结束之后被Redis自动移除。
+        """
+        self._remember(self.client.incr(self.generation_key))
+        return self.generation
+
+    def _make_key(self, generation, name):
+        return "{}:v{}:{}".format(self.namespace, generation, name)
+
+    def _current_generation(self):
+        if time.monotonic() >= self.expire_at:
+            generation = self.client.get(self.generation_key)
+            self._remember(0 if generation is None else int(generation))
+        return self.generation
+
+    def _remember(self, generation):
+        self.generation = generation
+        self.expire_at = time.monotonic() + self.refresh_interval
+
+
+if __name__ == "__main__":
+    import os
+    from redis import Redis
+
+    from json_cache import JsonCache
+
+    host = os.getenv("REDIS_HOST") if os.getenv("REDIS_HOST") else "localhost"
+    client = Redis(host, port=6379, decode_responses=True)
+
+    posts = NamespacedCache(client, "posts")
+    posts.set(10086, "<html><p>Hello World!</p></html>", 60)
+    posts.set(10087, "<html><p>Hello Redis!</p></html>", 60)
+    assert posts.get(10086) == "<html><p>Hello World!</p></html>"
+
+    # 一次INCR使命名空间内的全部缓存失效
+    posts.invalidate()
+    assert posts.get(10086) is None
+    assert posts.get_many([10086, 10087]) == [None, None]
+
+    users = NamespacedCache(client, "users", JsonCache(client))
+    users.set("10086", {"id": 10086, "name": "Peter"}, 60)
+    assert users.get("10086") == {"id": 10086, "name": "Peter"}
+    users.invalidate()
+    assert users.get("10086") is None
@@ -0,0 +1,213 @@
+import threading
+import time
+from collections import OrderedDict
+
+from redis import ConnectionError, TimeoutError
+
+from cache import NEGATIVE_CONTENTS, Cache
+
+# Redis 推送失效消息时使用的频道
+INVALIDATE_CHANNEL = "__redis__:invalidate"
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_LOCAL_TTL = 60
+
+# 监听连接断开之后，重新建立连接前的等待时长，单位为秒
+RECONNECT_INTERVAL = 1
+
+
+class NearCache(Cache):
+
+    def __init__(
+        self,
+        client,
+        max_entries=DEFAULT_MAX_ENTRIES,
+        max_bytes=DEFAULT_MAX_BYTES,
+        local_ttl=DEFAULT_LOCAL_TTL,
+        prefixes=(),
+        namespace="NearCache",
+    ):
+        """
+        创建一个带有进程内近端缓存的缓存对象。
+        max_entries和max_bytes分别限制近端缓存的条目数量和总字节数，
+        超出限制时按照LRU顺序淘汰；local_ttl限制条目在本地的最长存活时间，
+        条目在本地的存活时间同时不会超过其在Redis中的剩余生存时间。
+        prefixes用于指定需要接收失效消息的键前缀，留空表示全部键。
+        namespace用于指定统计指标所属的命名空间。
+        """
+        super().__init__(client, namespace)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.local_ttl = local_ttl
+        self.prefixes = tuple(prefixes)
+        self.encoder = client.connection_pool.get_encoder()
+        # 键 -> (值, 过期时刻, 字节数)，按照最近访问顺序排列
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        # 每收到一次失效消息就加一，用于发现读取过程中发生的失效
+        self.epoch = 0
+        self.tracking = False
+        self.closed = False
+        self.conn = None
+        self._connect()
+        self.listener = threading.Thread(target=self._listen, daemon=True)
+        self.listener.start()
+
+    def set(self, name, content, ttl=None):
+        """
+        为指定名字的缓存设置内容。
+        可选的ttl参数用于设置缓存的生存时间。
+        """
+        super().set(name, content, ttl)
+        # 写入会触发失效消息，这里提前移除本地副本，避免在消息到达前读到旧值
+        self._invalidate(self.encoder.encode(name))
+
+    def set_many(self, mapping, ttl=None):
+        """
+        为多个名字的缓存一次性设置内容，mapping为名字到内容的映射。
+        可选的ttl参数用于为所有缓存设置相同的生存时间。
+        """
+        super().set_many(mapping, ttl)
+        for name in mapping:
+            self._invalidate(self.encoder.encode(name))
+
+    def get(self, name):
+        """
+        尝试获取指定名字的缓存内容，若缓存不存在则返回None。
+        命中近端缓存时无需访问Redis。
+        """
+        start = time.perf_counter()
+        key = self.encoder.encode(name)
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                content, expire_at, _ = entry
+                if expire_at > now:
+                    self.entries.move_to_end(key)
+                    self._observe_get([content], time.perf_counter() - start)
+                    return None if content in NEGATIVE_CONTENTS else content
+                self._remove(key)
+            epoch = self.epoch
+
+        # 近端缓存未命中，在同一次往返中取出内容及其剩余生存时间
+        tx = self.client.pipeline(transaction=False)
+        tx.get(name)
+        tx.pttl(name)
+        content, pttl = tx.execute()
+        self._observe_get([content], time.perf_counter() - start)
+        if content is None:
+            return None
+
+        ttl = self.local_ttl
+        if pttl >= 0:
+            ttl = min(ttl, pttl / 1000)
+        size = len(content)
+        with self.lock:
+            # 读取期间如果收到过失效消息，那么读到的值可能已经过时，不放入近端缓存
+            if self.tracking and self.epoch == epoch and size <= self.max_bytes:
+                self._remove(key)
+                self.entries[key] = (content, now + ttl, size)
+                self.total_bytes += size
+                self._evict()
+        return None if content in NEGATIVE_CONTENTS else content
+
+    def close(self):
+        """
+        停止接收失效消息并清空近端缓存。
+        """
+        self.closed = True
+        self.listener.join()
+        with self.lock:
+            self.tracking = False
+            self._clear()
+
+    def _connect(self):
+        # 使用一条专用连接开启广播模式的键追踪，并把失效消息重定向给它自己
+        conn = self.client.connection_pool.make_connection()
+        conn.connect()
+        conn.send_command("CLIENT", "ID")
+        client_id = conn.read_response()
+        args = ["CLIENT", "TRACKING", "ON", "REDIRECT", client_id, "BCAST"]
+        for prefix in self.prefixes:
+            args.extend(["PREFIX", prefix])
+        conn.send_command(*args)
+        conn.read_response()
+        conn.send_command("SUBSCRIBE", INVALIDATE_CHANNEL)
+        conn.read_response()
+        self.conn = conn
+        with self.lock:
+            self.tracking = True
+
+    def _listen(self):
+        while not self.closed:
+            try:
+                if self.conn is None:
+                    self._connect()
+                if not self.conn.can_read(timeout=RECONNECT_INTERVAL):
+                    continue
+                _, _, keys = self.conn.read_response()
+                with self.lock:
+                    self.epoch += 1
+                    if keys is None:
+                        # FLUSHALL/FLUSHDB等命令会发送空的失效消息
+                        self._clear()
+                    else:
+                        for key in keys:
+                            self._remove(self.encoder.encode(key))
+            except (ConnectionError, TimeoutError, OSError):
+                # 连接断开期间无法得知哪些键已经失效，只能清空近端缓存
+                with self.lock:
+                    self.tracking = False
+                    self.epoch += 1
+                    self._clear()
+                if self.conn is not None:
+                    self.conn.disconnect()
+                    self.conn = None
+                time.sleep(RECONNECT_INTERVAL)
+        if self.conn is not None:
+            self.conn.disconnect()
+            self.conn = None
+
+    def _invalidate(self, key):
+        with self.lock:
+            self.epoch += 1
+            self._remove(key)
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry[2]
+
+    def _clear(self):
+        self.entries.clear()
+        self.total_bytes = 0
+
+    def _evict(self):
+        while len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes:
+            _, (_, _, size) = self.entries.popitem(last=False)
+            self.total_bytes -= size
+
+
+if __name__ == "__main__":
+    import os
+    from redis import Redis
+
+    host = os.getenv("REDIS_HOST") if os.getenv("REDIS_HOST") else "localhost"
+    client = Redis(host, port=6379, decode_responses=True)
+
+    cache = NearCache(client, prefixes=["Post:"])
+    cache.set("Post:10086", "<html><p>Hello World!</p></html>", 60)
+
+    assert cache.get("Post:10086") == "<html><p>Hello World!</p></html>"
+    # 第二次读取直接命中近端缓存
+    assert b"Post:10086" in cache.entries
+
+    # 其他进程修改键之后，失效消息会移除本地副本
+    client.set("Post:10086", "<html><p>Bye!</p></html>")
+    time.sleep(0.1)
+    assert cache.get("Post:10086") == "<html><p>Bye!</p></html>"
+
+    cache.close()
@@ -1,33 +1,282 @@
+import mmap
+import os
+import secrets
+import time
+
 from cache import Cache
+from compression import get_compressor, pack, unpack
+
+# 数据长度达到该值（单位为字节）时才尝试压缩
+DEFAULT_THRESHOLD = 1024
+
+# 分块模式下，每个流水线或每次MGET最多包含的分块数量
+PIPELINE_CHUNKS = 16
+
+# 文件被重新写入之后，旧版本的分块继续保留的时长，单位为毫秒
+# 在此期间，正在读取旧版本的读者仍然可以读完整个文件
+OLD_CHUNKS_GRACE = 30000
+
+
+def make_manifest_key(name):
+    """
+    构建分块模式下记录文件元数据的清单键。
+    例子：BinaryCache:logo.png:manifest
+    """
+    return "BinaryCache:{}:manifest".format(name)
+
+
+def make_chunk_key(name, version, index):
+    """
+    构建分块模式下存储单个分块的键，version用于区分同一文件的不同写入。
+    例子：BinaryCache:logo.png:chunk:123456:0
+    """
+    return "BinaryCache:{}:chunk:{}:{}".format(name, version, index)
+
 
 class BinaryCache:
 
-    def __init__(self, client):
-        self.cache = Cache(client)
+    def __init__(
+        self,
+        client,
+        compression=None,
+        threshold=DEFAULT_THRESHOLD,
+        chunk_size=None,
+        namespace="BinaryCache",
+    ):
+        """
+        创建一个缓存二进制数据的缓存对象。
+        可选的compression参数用于开启透明压缩，可以是'zlib'、'zstd'或'lz4'，
+        开启后长度达到threshold字节的数据会在压缩后再缓存，并在获取时自动解压。
+        压缩数据以魔数开头，不带魔数的数据原样返回，
+        因此开启压缩前后写入的缓存可以被任意缓存对象正确读取。
+        可选的chunk_size参数用于开启分块模式，文件会被切分为chunk_size字节的分块，
+        分块模式下压缩针对每个分块单独进行。
+        可选的namespace参数用于指定统计指标所属的命名空间，压缩和解压耗时计入序列化耗时。
+        """
+        self.client = client
+        self.cache = Cache(client, namespace)
+        self.metrics = self.cache.metrics
+        self.compressor = None if compression is None else get_compressor(compression)
+        self.threshold = threshold
+        self.chunk_size = chunk_size
 
     def set(self, name, path, ttl=None):
         """
         根据给定的名字和文件路径，缓存指定的二进制文件数据。
         可选的ttl参数用于设置缓存的生存时间。
         """
-        # 以二进制方式打开文件，并读取文件中的数据
-        file = open(path, "rb")
-        data = file.read()
-        file.close()
-        # 缓存二进制数据
-        self.cache.set(name, data, ttl)
+        with open(path, "rb") as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                # 空文件无法被映射
+                self.set_buffer(name, b"", ttl)
+                return
+            # 把文件映射到内存，数据直接从页缓存发送给Redis，无需先读入Python对象
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                self.set_buffer(name, data, ttl)
+
+    def set_buffer(self, name, buffer, ttl=None):
+        """
+        缓存给定的二进制数据，buffer可以是bytes、bytearray、memoryview、mmap等
+        任何支持缓冲区协议的对象，未开启压缩时数据不会被额外复制（恰好以魔数开头的数据除外）。
+        可选的ttl参数用于设置缓存的生存时间。
+        """
+        view = memoryview(buffer).cast("B")
+        try:
+            if self.chunk_size is not None:
+                self._set_chunked(name, view, ttl)
+            else:
+                # 未开启压缩时数据同样经过pack()，以魔数开头的原始数据需要转义，否则读取时会被误认为压缩数据
+                self.cache.set(name, self._pack(view), ttl)
+        finally:
+            view.release()
 
     def get(self, name):
         """
         尝试获取指定名字的缓存内容，若缓存不存在则返回None。
         """
-        return self.cache.get(name)
+        if self.chunk_size is not None:
+            chunks = self.get_stream(name)
+            return None if chunks is None else b"".join(chunks)
+        data = self.cache.get(name)
+        if data is not None:
+            return self._unpack(data)
+        return data
+
+    def get_into(self, name, buffer):
+        """
+        把缓存内容写入调用者提供的可写缓冲区（例如bytearray或可写的mmap），
+        并返回写入的字节数；若缓存不存在则返回None。
+        分块模式下内容逐块写入缓冲区，不会在内存中拼接出完整的数据。
+        """
+        view = memoryview(buffer).cast("B")
+        try:
+            if self.chunk_size is None:
+                data = self.get(name)
+                if data is None:
+                    return None
+                self._check_capacity(name, view, len(data))
+                view[:len(data)] = data
+                return len(data)
+            manifest = self._lookup(name)
+            if manifest is None:
+                return None
+            version, size, count = manifest
+            self._check_capacity(name, view, size)
+            offset = 0
+            for chunk in self._iter_chunks(name, version, range(count)):
+                view[offset:offset + len(chunk)] = chunk
+                offset += len(chunk)
+            return offset
+        finally:
+            view.release()
+
+    def get_stream(self, name):
+        """
+        分块模式下，返回一个按顺序逐块产出缓存内容的生成器，若缓存不存在则返回None。
+        内存中同时最多只保存PIPELINE_CHUNKS个分块。
+        """
+        manifest = self._lookup(name)
+        if manifest is None:
+            return None
+        version, _, count = manifest
+        return self._iter_chunks(name, version, range(count))
+
+    def get_file(self, name, file):
+        """
+        分块模式下，把缓存内容逐块写入给定的文件对象，并返回写入的字节数。
+        若缓存不存在则返回None。
+        """
+        chunks = self.get_stream(name)
+        if chunks is None:
+            return None
+        written = 0
+        for chunk in chunks:
+            written += file.write(chunk)
+        return written
+
+    def get_range(self, name, offset, length):
+        """
+        分块模式下，返回缓存内容中从offset开始、最多length字节的部分，
+        只会取出覆盖该范围的分块。若缓存不存在则返回None。
+        """
+        manifest = self._lookup(name)
+        if manifest is None:
+            return None
+        version, size, count = manifest
+        end = min(offset + length, size)
+        if offset >= end:
+            return b""
+        first = offset // self.chunk_size
+        last = (end - 1) // self.chunk_size
+        data = b"".join(self._iter_chunks(name, version, range(first, last + 1)))
+        start = offset - first * self.chunk_size
+        return data[start:start + end - offset]
+
+    def stats(self):
+        """
+        返回本缓存所属命名空间的统计指标快照。
+        """
+        return self.cache.stats()
+
+    def _pack(self, data):
+        start = time.perf_counter()
+        data = pack(self.compressor, data, self.threshold)
+        self.metrics.observe_serialize(time.perf_counter() - start)
+        return data
+
+    def _unpack(self, data):
+        start = time.perf_counter()
+        data = unpack(data)
+        self.metrics.observe_serialize(time.perf_counter() - start, decode=True)
+        return data
+
+    def _lookup(self, name):
+        # 读取清单并在缓存不存在时记录一次未命中，命中则在读完分块后记录
+        start = time.perf_counter()
+        manifest = self._get_manifest(name)
+        if manifest is None:
+            self.metrics.observe_get(0, 1, 0, time.perf_counter() - start)
+        return manifest
+
+    def _check_capacity(self, name, view, size):
+        if len(view) < size:
+            raise ValueError("Buffer is too small for cache '{}' of {} bytes!".format(name, size))
+
+    def _set_chunked(self, name, view, ttl):
+        manifest_key = make_manifest_key(name)
+        old_manifest = self._get_manifest(name)
+        # 新版本的分块写在新的键里，写完之后再切换清单，读者不会读到新旧混杂的内容
+        version = secrets.randbits(48)
+        start = time.monotonic()
+        write_start = time.perf_counter()
+        size = 0
+        count = 0
+        tx = self.client.pipeline(transaction=False)
+        for offset in range(0, len(view), self.chunk_size):
+            # 对memoryview切片不会复制数据
+            chunk = view[offset:offset + self.chunk_size]
+            size += len(chunk)
+            chunk = self._pack(chunk)
+            tx.set(make_chunk_key(name, version, count), chunk, ex=ttl)
+            count += 1
+            if count % PIPELINE_CHUNKS == 0:
+                tx.execute()
+        tx.hset(
+            manifest_key,
+            mapping={"version": version, "size": size, "chunk_size": self.chunk_size, "count": count},
+        )
+        if ttl is None:
+            tx.persist(manifest_key)
+        else:
+            # 让清单不晚于最早写入的分块过期，避免清单指向已经过期的分块
+            elapsed = int((time.monotonic() - start) * 1000)
+            tx.pexpire(manifest_key, max(ttl * 1000 - elapsed, 1))
+        tx.execute()
+        self.metrics.observe_set(1, size, time.perf_counter() - write_start)
+        if old_manifest is not None:
+            # 不直接删除旧版本的分块，而是让它们在宽限期之后过期
+            old_version, _, old_count = old_manifest
+            tx = self.client.pipeline(transaction=False)
+            for i in range(old_count):
+                tx.pexpire(make_chunk_key(name, old_version, i), OLD_CHUNKS_GRACE)
+                if (i + 1) % PIPELINE_CHUNKS == 0:
+                    tx.execute()
+            tx.execute()
+
+    def _get_manifest(self, name):
+        version, size, chunk_size, count = self.client.hmget(
+            make_manifest_key(name), "version", "size", "chunk_size", "count"
+        )
+        if version is None:
+            return None
+        if int(chunk_size) != self.chunk_size:
+            raise ValueError("Cache '{}' was written with chunk size {}!".format(name, int(chunk_size)))
+        return int(version), int(size), int(count)
+
+    def _iter_chunks(self, name, version, indexes):
+        elapsed = 0
+        nbytes = 0
+        for i in range(0, len(indexes), PIPELINE_CHUNKS):
+            keys = [make_chunk_key(name, version, index) for index in indexes[i:i + PIPELINE_CHUNKS]]
+            start = time.perf_counter()
+            chunks = self.client.mget(keys)
+            elapsed += time.perf_counter() - start
+            for key, chunk in zip(keys, chunks):
+                if chunk is None:
+                    # 分块已经过期，或者文件在读取期间被重新写入
+                    raise ValueError("Chunk '{}' is missing!".format(key))
+                nbytes += len(chunk)
+                yield self._unpack(chunk)
+        self.metrics.observe_get(1, 0, nbytes, elapsed)
 
 if __name__ == "__main__":
+  import io
   import os
 
   from redis import Redis
 
+  from compression import MAGIC
+
   host = os.getenv("REDIS_HOST") if os.getenv("REDIS_HOST") else "localhost"
 
   client = Redis(host)
@@ -36,3 +285,44 @@ if __name__ == "__main__":
   cache.set("pyproject.toml", "./pyproject.toml")
 
   assert cache.get("pyproject.toml")[:10] == b"[project]\n"
+
+  compressed_cache = BinaryCache(client, compression="zlib", threshold=64)
+  compressed_cache.set("uv.lock", "./uv.lock")
+  assert compressed_cache.get("uv.lock") == open("./uv.lock", "rb").read()
+  assert client.strlen("uv.lock") < len(compressed_cache.get("uv.lock"))
+  assert cache.get("uv.lock") == compressed_cache.get("uv.lock")
+
+  # 开启压缩之前写入的旧值，即使以0x00或者0x01开头也能原样读出
+  for legacy in [b"\x00\x00\x01\x00" + bytes(2000), b"\x01" + bytes(2000)]:
+    cache.set_buffer("legacy.ico", legacy)
+    assert compressed_cache.get("legacy.ico") == legacy
+
+  # 未开启压缩时，恰好以魔数开头的原始数据也能原样读出
+  for raw_cache in [cache, BinaryCache(client, chunk_size=1024)]:
+    raw_cache.set_buffer("magic.bin", MAGIC + b"\x01" + bytes(2000))
+    assert raw_cache.get("magic.bin") == MAGIC + b"\x01" + bytes(2000)
+
+  chunked_cache = BinaryCache(client, chunk_size=1024)
+  chunked_cache.set("uv.lock", "./uv.lock", 60)
+  data = open("./uv.lock", "rb").read()
+  assert chunked_cache.get("uv.lock") == data
+  assert chunked_cache.get_range("uv.lock", 1000, 100) == data[1000:1100]
+  buffer = io.BytesIO()
+  assert chunked_cache.get_file("uv.lock", buffer) == len(data)
+  assert buffer.getvalue() == data
+
+  # 读取期间文件被重新写入，读者仍然可以读完旧版本
+  stream = chunked_cache.get_stream("uv.lock")
+  first_chunk = next(stream)
+  chunked_cache.set_buffer("uv.lock", b"new content", 60)
+  assert first_chunk + b"".join(stream) == data
+  assert chunked_cache.get("uv.lock") == b"new content"
+  chunked_cache.set("uv.lock", "./uv.lock", 60)
+
+  target = bytearray(len(data))
+  assert chunked_cache.get_into("uv.lock", target) == len(data)
+  assert target == data
+  cache.set_buffer("bytes", memoryview(data)[:10])
+  assert cache.get("bytes") == b"version = "
+
+  print(chunked_cache.stats())
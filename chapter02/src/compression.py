@@ -0,0 +1,104 @@
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+# 经过pack()处理的数据以这个魔数开头，魔数之后的一个字节记录压缩算法
+# 不带魔数的数据被视为原样存储的数据，包括开启压缩之前写入的旧值
+MAGIC = b"\x8eRCz"
+
+# 各压缩算法的标记字节，0x00表示数据未经压缩
+# 只有本身恰好以魔数开头的原始数据才需要带上0x00标记，以免被误认为压缩数据
+TAG_RAW = 0x00
+TAG_ZLIB = 0x01
+TAG_ZSTD = 0x02
+TAG_LZ4 = 0x03
+
+# 名字 -> 压缩器
+COMPRESSORS = {}
+# 标记字节 -> 压缩器
+COMPRESSORS_BY_TAG = {}
+
+
+class Compressor:
+
+    def __init__(self, name, tag, compress, decompress):
+        """
+        创建一个压缩器。
+        compress和decompress分别负责压缩和解压bytes，
+        tag则是写在压缩结果开头、用于在解压时识别算法的单个字节。
+        """
+        self.name = name
+        self.tag = tag
+        self.compress = compress
+        self.decompress = decompress
+
+
+def register_compressor(compressor):
+    """
+    注册一个压缩器，之后即可通过名字使用它，并能解压带有它的标记字节的数据。
+    """
+    if compressor.tag in COMPRESSORS_BY_TAG:
+        raise ValueError("Tag {} is already registered!".format(compressor.tag))
+    COMPRESSORS[compressor.name] = compressor
+    COMPRESSORS_BY_TAG[compressor.tag] = compressor
+
+
+def get_compressor(name):
+    """
+    返回指定名字的压缩器，名字未注册（例如依赖的库没有安装）时抛出ValueError。
+    """
+    compressor = COMPRESSORS.get(name)
+    if compressor is None:
+        raise ValueError("Compressor '{}' is not available!".format(name))
+    return compressor
+
+
+def pack(compressor, data, threshold):
+    """
+    长度达到threshold的数据使用给定压缩器压缩，压缩结果的开头带有魔数和压缩算法的标记字节。
+    较短的或者压缩后反而变大的数据保持原样，不会被复制。
+    compressor为None时不进行压缩，只对恰好以魔数开头的数据加上未压缩标记。
+    """
+    if compressor is not None and len(data) >= threshold:
+        compressed = compressor.compress(data)
+        if len(compressed) + len(MAGIC) + 1 < len(data):
+            return MAGIC + bytes([compressor.tag]) + compressed
+    if data[:len(MAGIC)] == MAGIC:
+        return MAGIC + bytes([TAG_RAW]) + data
+    return data
+
+
+def unpack(data):
+    """
+    解压由pack()生成的数据，不以魔数开头的数据原样返回。
+    """
+    if data[:len(MAGIC)] != MAGIC:
+        return data
+    tag = data[len(MAGIC)]
+    if tag == TAG_RAW:
+        return data[len(MAGIC) + 1:]
+    compressor = COMPRESSORS_BY_TAG.get(tag)
+    if compressor is None:
+        raise ValueError("Unknown compression tag {}!".format(tag))
+    return compressor.decompress(data[len(MAGIC) + 1:])
+
+
+register_compressor(Compressor("zlib", TAG_ZLIB, zlib.compress, zlib.decompress))
+
+if zstandard is not None:
+    register_compressor(
+        Compressor("zstd", TAG_ZSTD, zstandard.compress, zstandard.decompress)
+    )
+
+if lz4 is not None:
+    register_compressor(
+        Compressor("lz4", TAG_LZ4, lz4.frame.compress, lz4.frame.decompress)
+    )
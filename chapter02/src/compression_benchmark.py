@@ -0,0 +1,88 @@
+import csv
+import io
+import json
+import os
+import random
+import tempfile
+import time
+
+from redis import Redis
+
+from binary_cache import BinaryCache
+from compression import COMPRESSORS
+
+ROUNDS = 10
+
+host = os.getenv("REDIS_HOST") if os.getenv("REDIS_HOST") else "localhost"
+client = Redis(host)
+
+
+def make_corpus(directory):
+    """
+    在给定目录中构建一组包含多种文件类型的语料，返回文件名到文件路径的映射。
+    """
+    random.seed(10086)
+    files = {}
+
+    def write(name, data):
+        path = os.path.join(directory, name)
+        with open(path, "wb") as file:
+            file.write(data)
+        files[name] = path
+
+    # 源代码和锁文件：重复度高的文本
+    for name in ["uv.lock", "pyproject.toml", "src/binary_cache.py"]:
+        with open(name, "rb") as file:
+            write(os.path.basename(name), file.read())
+    # JSON格式的接口响应
+    records = [
+        {"id": i, "name": "User{}".format(i), "score": random.random(), "tags": ["a", "b"]}
+        for i in range(2000)
+    ]
+    write("users.json", json.dumps(records).encode())
+    # CSV格式的报表
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for i in range(5000):
+        writer.writerow([i, "2025-08-{:02}".format(i % 28 + 1), random.randint(0, 1000)])
+    write("report.csv", buffer.getvalue().encode())
+    # 已经压缩过的图片等数据：近似于随机字节
+    write("photo.jpg", random.randbytes(256 * 1024))
+    # 小文件：低于阈值，不会被压缩
+    write("favicon.ico", random.randbytes(512))
+    return files
+
+
+# 语料写在临时目录中，测试结束后连同目录一起删除
+with tempfile.TemporaryDirectory(prefix="bench_corpus_") as directory:
+    corpus = make_corpus(directory)
+    total = sum(os.path.getsize(path) for path in corpus.values())
+
+    print(f"{'codec':>6} {'ratio':>7} {'set MB/s':>9} {'get MB/s':>9} {'memory':>10} {'saved':>10}")
+    for name in [None] + list(COMPRESSORS):
+        cache = BinaryCache(client, compression=name)
+        keys = ["Bench:Asset:{}".format(file) for file in corpus]
+
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            for key, path in zip(keys, corpus.values()):
+                cache.set(key, path)
+        set_rate = total * ROUNDS / (time.perf_counter() - start) / 1024 / 1024
+
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            for key in keys:
+                cache.get(key)
+        get_rate = total * ROUNDS / (time.perf_counter() - start) / 1024 / 1024
+
+        stored = sum(client.strlen(key) for key in keys)
+        memory = sum(client.memory_usage(key) for key in keys)
+        if name is None:
+            baseline = memory
+        client.delete(*keys)
+
+        label = name or "raw"
+        print(
+            f"{label:>6} {total / stored:>7.2f} {set_rate:>9.1f} {get_rate:>9.1f} "
+            f"{memory:>10} {baseline - memory:>10}"
+        )
@@ -0,0 +1,76 @@
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+
+from redis import Redis
+
+from binary_cache import BinaryCache
+
+FILE_SIZE = 64 * 1024 * 1024
+CHUNK_SIZE = 1024 * 1024
+KEY = "Bench:ZeroCopy"
+
+SCENARIOS = ["read+get", "mmap+get", "mmap+get_into", "chunked+get_into"]
+
+
+def run(scenario, path):
+    """
+    在独立进程中执行一种上传/下载方式，返回上传和下载阶段Python对象的峰值内存，
+    以及进程的峰值RSS，单位均为字节。
+    """
+    host = os.getenv("REDIS_HOST") if os.getenv("REDIS_HOST") else "localhost"
+    client = Redis(host)
+    chunk_size = CHUNK_SIZE if scenario.startswith("chunked") else None
+    cache = BinaryCache(client, chunk_size=chunk_size)
+    target = bytearray(FILE_SIZE) if scenario.endswith("get_into") else None
+
+    tracemalloc.start()
+    if scenario == "read+get":
+        # 改造之前的实现：先把整个文件读入bytes，再整体发送
+        with open(path, "rb") as file:
+            data = file.read()
+        cache.cache.set(KEY, data)
+        del data
+    else:
+        cache.set(KEY, path)
+    _, set_peak = tracemalloc.get_traced_memory()
+
+    tracemalloc.reset_peak()
+    if target is None:
+        data = cache.get(KEY)
+        assert len(data) == FILE_SIZE
+        del data
+    else:
+        assert cache.get_into(KEY, target) == FILE_SIZE
+    _, get_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return set_peak, get_peak, rss
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3:
+        print(*run(sys.argv[1], sys.argv[2]))
+        sys.exit()
+
+    with tempfile.NamedTemporaryFile() as file:
+        file.write(os.urandom(FILE_SIZE))
+        file.flush()
+
+        print(f"{'scenario':>18} {'set copies':>11} {'get copies':>11} {'peak RSS MB':>12}")
+        for scenario in SCENARIOS:
+            output = subprocess.run(
+                [sys.executable, __file__, scenario, file.name],
+                capture_output=True,
+                check=True,
+                text=True,
+            ).stdout
+            set_peak, get_peak, rss = map(int, output.split())
+            print(
+                f"{scenario:>18} {set_peak / FILE_SIZE:>11.2f} {get_peak / FILE_SIZE:>11.2f} "
+                f"{rss / 1024 / 1024:>12.1f}"
+            )
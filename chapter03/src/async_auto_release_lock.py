@@ -0,0 +1,73 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+from async_lock import AsyncLock, complete_acquire, wait_for_release
+from lock import VALUE_OF_LOCK
+
+
+class AsyncAutoReleaseLock(AsyncLock):
+
+    async def acquire(self, timeout, unit="sec", blocking=False, wait_timeout=None):
+        """
+        尝试获取一个能够在指定时长之后自动释放的锁，参数的含义与AutoReleaseLock.acquire()相同。
+        blocking为True时，等待锁的调用者不会阻塞事件循环。
+        """
+        if unit == "sec":
+            options = {"ex": timeout}
+        elif unit == "ms":
+            options = {"px": timeout}
+        else:
+            raise ValueError("Unit must be 'sec' or 'ms'!")
+        deadline = None if wait_timeout is None else time.monotonic() + wait_timeout
+        attempt = 0
+        while not await complete_acquire(
+            self.client.set(self.key, VALUE_OF_LOCK, nx=True, **options), self.release
+        ):
+            if not blocking or not await wait_for_release(self.key, deadline, attempt):
+                return False
+            attempt += 1
+        return True
+
+    @asynccontextmanager
+    async def locked(self, timeout, unit="sec", wait_timeout=None):
+        """
+        在async with语句中持有一个能够自动释放的锁，
+        timeout和unit用于设置最大加锁时长，wait_timeout为最长等待时间。
+        等待超时将引发TimeoutError；离开语句块时总会释放锁，即使协程已经被取消。
+        """
+        if not await self.acquire(timeout, unit, blocking=True, wait_timeout=wait_timeout):
+            raise TimeoutError("Timed out waiting for lock {}".format(self.key))
+        try:
+            yield self
+        finally:
+            await asyncio.shield(self.release())
+
+    async def __aenter__(self):
+        raise TypeError("Use 'async with lock.locked(timeout)' to set the lock timeout")
+
+
+if __name__ == "__main__":
+    import os
+
+    from redis.asyncio import Redis
+
+    async def main():
+        host = os.getenv("REDIS_HOST") if os.getenv("REDIS_HOST") else "localhost"
+        client = Redis(host=host)
+
+        lock = AsyncAutoReleaseLock(client, "Lock:10091")
+
+        assert await lock.acquire(500, "ms")
+        # 锁过期之后等待者依靠退避重试获取锁
+        assert await lock.acquire(5, blocking=True, wait_timeout=2)
+        assert await lock.release()
+
+        async with lock.locked(5):
+            assert not await lock.acquire(5)
+        assert await lock.acquire(5)
+        assert await lock.release()
+
+        await client.aclose()
+
+    asyncio.run(main())
@@ -0,0 +1,183 @@
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+
+from lock import MAX_WAIT_INTERVAL, MIN_WAIT_INTERVAL, NOTIFY_TTL, RELEASE_SCRIPT, VALUE_OF_LOCK, make_notify_key
+
+# 本进程中正在等待各个锁的协程：键 -> {asyncio.Event: None}，按照开始等待的先后排列
+# 等待者不占用任何Redis连接：本进程释放锁时直接唤醒最早的等待者，
+# 其他进程释放锁或者锁过期时，等待者依靠带抖动的退避重新尝试加锁
+waiters = {}
+
+
+async def wait_for_release(key, deadline, attempt):
+    """
+    wait_for_release()的协程版本：等待期间既不阻塞事件循环，也不占用连接池中的连接，
+    直到本进程释放了这个锁、退避时长用完或者到达deadline为止。
+    到达deadline时返回False，否则返回True。
+    """
+    backoff = min(MIN_WAIT_INTERVAL * 2 ** attempt, MAX_WAIT_INTERVAL)
+    wait = random.uniform(backoff / 2, backoff)
+    if deadline is not None:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        wait = min(wait, remaining)
+    event = asyncio.Event()
+    queue = waiters.setdefault(key, {})
+    queue[event] = None
+    try:
+        async with asyncio.timeout(wait):
+            await event.wait()
+    except TimeoutError:
+        pass
+    finally:
+        queue.pop(event, None)
+        if not queue and waiters.get(key) is queue:
+            del waiters[key]
+    return True
+
+
+def notify_release(key):
+    """
+    唤醒本进程中最早开始等待给定锁的协程。
+    """
+    queue = waiters.get(key)
+    if queue:
+        event = next(iter(queue))
+        del queue[event]
+        event.set()
+
+
+async def complete_acquire(attempt, undo):
+    """
+    等待给定的加锁命令执行完毕并返回它的结果。
+    如果调用者在等待期间被取消，那么仍然会等待已经发出的命令执行完毕，
+    加锁成功时调用undo撤销，避免被取消的调用者遗留一个无人释放的锁。
+    """
+    task = asyncio.ensure_future(attempt)
+    try:
+        return await asyncio.shield(task)
+    except asyncio.CancelledError:
+        if await task:
+            await undo()
+        raise
+
+
+class AsyncLock:
+
+    def __init__(self, client, key):
+        """
+        创建一个使用redis.asyncio客户端的锁，用法与Lock相同，
+        并且可以通过async with语句自动获取和释放锁。
+        """
+        self.client = client
+        self.key = key
+        self.notify_key = make_notify_key(key)
+        self.release_script = client.register_script(RELEASE_SCRIPT)
+
+    async def acquire(self, blocking=False, timeout=None):
+        """
+        尝试获取锁，成功时返回True，失败时则返回False。
+        blocking为True时，锁被占用的调用者会在不阻塞事件循环的情况下等待锁被释放，
+        可选的timeout参数用于设置最长等待时间，单位为秒，为None时一直等待。
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        attempt = 0
+        while not await self._try_acquire():
+            if not blocking or not await wait_for_release(self.key, deadline, attempt):
+                return False
+            attempt += 1
+        return True
+
+    async def release(self):
+        """
+        尝试释放锁，成功时返回True，失败时则返回False。
+        释放成功时会唤醒一个正在等待这个锁的调用者。
+        """
+        if await self.release_script(keys=[self.key, self.notify_key], args=[NOTIFY_TTL]) != 1:
+            return False
+        notify_release(self.key)
+        return True
+
+    @asynccontextmanager
+    async def locked(self, timeout=None):
+        """
+        在async with语句中持有锁，timeout为最长等待时间，单位为秒，为None时一直等待。
+        等待超时将引发TimeoutError；离开语句块时总会释放锁，即使协程已经被取消。
+        """
+        if not await self.acquire(blocking=True, timeout=timeout):
+            raise TimeoutError("Timed out waiting for lock {}".format(self.key))
+        try:
+            yield self
+        finally:
+            await asyncio.shield(self.release())
+
+    async def __aenter__(self):
+        await self.acquire(blocking=True)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await asyncio.shield(self.release())
+
+    async def _try_acquire(self):
+        return await complete_acquire(
+            self.client.set(self.key, VALUE_OF_LOCK, nx=True), self.release
+        ) is True
+
+
+if __name__ == "__main__":
+    import os
+
+    from redis.asyncio import BlockingConnectionPool, Redis
+
+    async def main():
+        host = os.getenv("REDIS_HOST") if os.getenv("REDIS_HOST") else "localhost"
+        client = Redis(host=host)
+
+        lock = AsyncLock(client, "Lock:10090")
+        assert await lock.acquire()
+        assert not await lock.acquire(blocking=True, timeout=0.1)
+        assert await lock.release()
+
+        # 上千个协程在同一个锁上排队，等待期间既不占用线程，也不占用连接
+        counter = 0
+
+        async def worker():
+            nonlocal counter
+            async with lock:
+                value = counter
+                await asyncio.sleep(0)
+                counter = value + 1
+
+        await asyncio.gather(*(worker() for _ in range(1000)))
+        assert counter == 1000
+
+        # 等待者的数量远多于连接池中的连接，持有者仍然能够释放锁
+        small = Redis(connection_pool=BlockingConnectionPool(host=host, max_connections=5))
+        small_lock = AsyncLock(small, "Lock:10092")
+        await small.delete("Lock:10092")
+        assert await small_lock.acquire()
+        waiting = asyncio.gather(*(small_lock.acquire(blocking=True, timeout=1) for _ in range(20)))
+        await asyncio.sleep(0.1)
+        assert await small_lock.release()
+        assert (await waiting).count(True) == 1
+        assert await small_lock.release()
+        await small.aclose()
+
+        # 被取消的持有者也会释放锁
+        async def holder():
+            async with lock.locked():
+                await asyncio.sleep(10)
+
+        task = asyncio.create_task(holder())
+        await asyncio.sleep(0.1)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        assert await lock.acquire()
+        assert await lock.release()
+
+        await client.aclose()
+
+    asyncio.run(main())
@@ -1,3 +1,7 @@
+import time
+
+from lock import NOTIFY_TTL, RELEASE_SCRIPT, make_notify_key, wait_for_release
+
 VALUE_OF_LOCK = ""
 
 class AutoReleaseLock:
@@ -5,26 +9,38 @@ class AutoReleaseLock:
     def __init__(self, client, key):
         self.client = client
         self.key = key
+        self.notify_key = make_notify_key(key)
+        self.release_script = client.register_script(RELEASE_SCRIPT)
 
-    def acquire(self, timeout, unit="sec"):
+    def acquire(self, timeout, unit="sec", blocking=False, wait_timeout=None):
         """
         尝试获取一个能够在指定时长之后自动释放的锁。
         timeout参数用于设置锁的最大加锁时长。
         可选的unit参数则用于设置时长的单位，
         它的值可以是代表秒的'sec'或是代表毫秒的'ms'，默认为'sec'。
+        blocking为True时，锁被占用的调用者会阻塞等待锁被释放或者过期，
+        可选的wait_timeout参数用于设置最长等待时间，单位为秒，为None时一直等待。
         """
         if unit == "sec":
-            return self.client.set(self.key, VALUE_OF_LOCK, nx=True, ex=timeout) is True
+            options = {"ex": timeout}
         elif unit == "ms":
-            return self.client.set(self.key, VALUE_OF_LOCK, nx=True, px=timeout) is True
+            options = {"px": timeout}
         else:
             raise ValueError("Unit must be 'sec' or 'ms'!")
+        deadline = None if wait_timeout is None else time.monotonic() + wait_timeout
+        attempt = 0
+        while self.client.set(self.key, VALUE_OF_LOCK, nx=True, **options) is not True:
+            if not blocking or not wait_for_release(self.client, self.key, deadline, attempt):
+                return False
+            attempt += 1
+        return True
 
     def release(self):
         """
         尝试释放锁，成功时返回True，失败时则返回False。
+        释放成功时会唤醒一个正在等待这个锁的调用者。
         """
-        return self.client.delete(self.key) == 1
+        return self.release_script(keys=[self.key, self.notify_key], args=[NOTIFY_TTL]) == 1
 
 if __name__ == "__main__":
     import os
@@ -45,3 +61,8 @@ if __name__ == "__main__":
     assert lock.acquire(5)
 
     assert lock.release()
+
+    # 锁过期时没有唤醒通知，等待者依靠退避重试获取锁
+    assert lock.acquire(500, "ms")
+    assert lock.acquire(5, blocking=True, wait_timeout=2)
+    assert lock.release()
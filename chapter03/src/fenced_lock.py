@@ -0,0 +1,177 @@
+import secrets
+import threading
+import time
+
+from auto_release_lock import AutoReleaseLock
+from lock import NOTIFY_TTL, wait_for_release
+
+# 加锁成功时同时递增并返回防护令牌
+ACQUIRE_SCRIPT = """
+if redis.call("SET", KEYS[1], ARGV[1], "NX", "PX", ARGV[2]) then
+    return redis.call("INCR", KEYS[2])
+end
+return false
+"""
+
+# 仅当锁仍然由自己持有时才删除锁，删除之后唤醒一个等待者
+RELEASE_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    redis.call("DEL", KEYS[1])
+    redis.call("LPUSH", KEYS[2], 1)
+    redis.call("LTRIM", KEYS[2], 0, 0)
+    redis.call("PEXPIRE", KEYS[2], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+# 仅当锁仍然由自己持有时才延长锁的过期时间
+EXTEND_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("PEXPIRE", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+def make_fencing_key(key):
+    """
+    构建记录锁的防护令牌的键。
+    例子：Lock:10087:fencing
+    """
+    return "{}:fencing".format(key)
+
+
+def to_milliseconds(timeout, unit):
+    if unit == "sec":
+        return int(timeout * 1000)
+    elif unit == "ms":
+        return int(timeout)
+    else:
+        raise ValueError("Unit must be 'sec' or 'ms'!")
+
+
+class FencedLock(AutoReleaseLock):
+
+    def __init__(self, client, key, auto_renew=True):
+        """
+        创建一个带有持有者身份和防护令牌的锁。
+        auto_renew为True时，加锁成功后会有一个后台线程定期延长锁的过期时间，
+        直到锁被释放或者发现锁已经被他人获取为止。
+        """
+        super().__init__(client, key)
+        self.fencing_key = make_fencing_key(key)
+        self.auto_renew = auto_renew
+        self.token = None
+        self.fencing_token = None
+        self.timeout_ms = None
+        self.stopped = None
+        self.watchdog = None
+        self.acquire_script = client.register_script(ACQUIRE_SCRIPT)
+        self.release_script = client.register_script(RELEASE_SCRIPT)
+        self.extend_script = client.register_script(EXTEND_SCRIPT)
+
+    def acquire(self, timeout, unit="sec", blocking=False, wait_timeout=None):
+        """
+        尝试获取锁，成功时返回一个单调递增的防护令牌，失败时返回None。
+        下游存储可以拒绝携带较旧令牌的写入，从而防止失去锁的旧持有者覆盖数据。
+        timeout参数用于设置锁的最大加锁时长，开启自动续期时锁会一直被延长到释放为止。
+        可选的unit参数用于设置时长的单位，可以是'sec'或'ms'，默认为'sec'。
+        blocking和wait_timeout参数的含义与AutoReleaseLock.acquire()相同。
+        """
+        timeout_ms = to_milliseconds(timeout, unit)
+        token = secrets.token_hex(16)
+        deadline = None if wait_timeout is None else time.monotonic() + wait_timeout
+        attempt = 0
+        while True:
+            fencing_token = self.acquire_script(
+                keys=[self.key, self.fencing_key], args=[token, timeout_ms]
+            )
+            if fencing_token is not None:
+                break
+            if not blocking or not wait_for_release(self.client, self.key, deadline, attempt):
+                return None
+            attempt += 1
+        self.token = token
+        self.fencing_token = fencing_token
+        self.timeout_ms = timeout_ms
+        if self.auto_renew:
+            self._start_watchdog()
+        return fencing_token
+
+    def extend(self, timeout=None, unit="sec"):
+        """
+        在锁仍然由自己持有的情况下，把锁的过期时间重新设置为timeout，
+        省略timeout时使用加锁时的时长。成功时返回True，锁已经丢失时返回False。
+        """
+        if self.token is None:
+            return False
+        timeout_ms = self.timeout_ms if timeout is None else to_milliseconds(timeout, unit)
+        return self.extend_script(keys=[self.key], args=[self.token, timeout_ms]) == 1
+
+    def release(self):
+        """
+        尝试释放锁，只有锁仍然由自己持有时才会被删除。
+        成功时返回True，锁已经过期或者被他人获取时返回False。
+        """
+        self._stop_watchdog()
+        if self.token is None:
+            return False
+        token, self.token = self.token, None
+        return self.release_script(keys=[self.key, self.notify_key], args=[token, NOTIFY_TTL]) == 1
+
+    def _start_watchdog(self):
+        self._stop_watchdog()
+        self.stopped = threading.Event()
+        self.watchdog = threading.Thread(
+            target=self._renew, args=(self.stopped, self.token), daemon=True
+        )
+        self.watchdog.start()
+
+    def _stop_watchdog(self):
+        if self.watchdog is not None:
+            self.stopped.set()
+            if self.watchdog is not threading.current_thread():
+                self.watchdog.join()
+            self.watchdog = None
+
+    def _renew(self, stopped, token):
+        # 每经过三分之一的加锁时长就续期一次，即使偶尔续期失败也还有重试的余地
+        interval = self.timeout_ms / 3 / 1000
+        while not stopped.wait(interval):
+            try:
+                renewed = self.extend_script(keys=[self.key], args=[token, self.timeout_ms]) == 1
+            except Exception:
+                # 网络抖动时继续尝试，锁真正过期之前还有机会续期成功
+                continue
+            if not renewed:
+                # 锁已经丢失，停止续期
+                return
+
+
+if __name__ == "__main__":
+    import os
+    import time
+
+    from redis import Redis
+
+    host = os.getenv("REDIS_HOST") if os.getenv("REDIS_HOST") else "localhost"
+    client = Redis(host)
+
+    lock = FencedLock(client, "Lock:10088")
+    other = FencedLock(client, "Lock:10088")
+
+    first_token = lock.acquire(1)
+    assert first_token is not None
+
+    # 后台线程会自动续期，超过加锁时长之后锁仍然有效
+    time.sleep(2)
+    assert other.acquire(1) is None
+    assert lock.release()
+
+    second_token = other.acquire(1)
+    assert second_token > first_token
+    assert lock.acquire(1, blocking=True, wait_timeout=0.1) is None
+    # 旧持有者无法释放他人持有的锁
+    assert not lock.release()
+    assert other.release()
@@ -1,23 +1,86 @@
+import random
+import time
+
 VALUE_OF_LOCK = ""
 
+# 被唤醒或等待超时之后重新尝试加锁前，最多等待的时长，单位为秒
+# 锁因过期而被自动释放时不会有唤醒通知，此时依靠这个带抖动的退避上限重新尝试
+MIN_WAIT_INTERVAL = 0.01
+MAX_WAIT_INTERVAL = 1
+# BLPOP能够接受的最短超时时长，单位为秒
+# Redis 7之前的服务器会把不足一毫秒的超时向下取整为0，也就是无限期地阻塞
+MIN_BLOCK_TIMEOUT = 0.001
+
+# 唤醒通知的存活时间，单位为毫秒，避免没有等待者时通知一直残留
+NOTIFY_TTL = 1000
+
+# 删除锁，并在删除成功时向通知列表推入一个唤醒令牌
+# 通知列表最多只保留一个令牌：每次释放最多只能让一个等待者成功加锁
+RELEASE_SCRIPT = """
+if redis.call("DEL", KEYS[1]) == 1 then
+    redis.call("LPUSH", KEYS[2], 1)
+    redis.call("LTRIM", KEYS[2], 0, 0)
+    redis.call("PEXPIRE", KEYS[2], ARGV[1])
+    return 1
+end
+return 0
+"""
+
+
+def make_notify_key(key):
+    """
+    构建锁被释放时用于唤醒等待者的通知列表键。
+    例子：Lock:10086:released
+    """
+    return "{}:released".format(key)
+
+
+def wait_for_release(client, key, deadline, attempt):
+    """
+    阻塞直到锁被释放、退避时长用完或者到达deadline为止。
+    deadline为None表示不设置等待期限；到达deadline时返回False，否则返回True。
+    """
+    backoff = min(MIN_WAIT_INTERVAL * 2 ** attempt, MAX_WAIT_INTERVAL)
+    wait = random.uniform(backoff / 2, backoff)
+    if deadline is not None:
+        remaining = deadline - time.monotonic()
+        if remaining < MIN_BLOCK_TIMEOUT:
+            return False
+        wait = min(wait, remaining)
+    # 在通知列表上阻塞，锁被释放时会立即被唤醒
+    client.blpop([make_notify_key(key)], timeout=wait)
+    return True
+
+
 class Lock:
 
     def __init__(self, client, key):
         self.client = client
         self.key = key
+        self.notify_key = make_notify_key(key)
+        self.release_script = client.register_script(RELEASE_SCRIPT)
 
-    def acquire(self):
+    def acquire(self, blocking=False, timeout=None):
         """
         尝试获取锁，成功时返回True，失败时则返回False。
+        blocking为True时，锁被占用的调用者会阻塞等待锁被释放，
+        可选的timeout参数用于设置最长等待时间，单位为秒，为None时一直等待。
         """
-        return self.client.set(self.key, VALUE_OF_LOCK, nx=True) is True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        attempt = 0
+        while self.client.set(self.key, VALUE_OF_LOCK, nx=True) is not True:
+            if not blocking or not wait_for_release(self.client, self.key, deadline, attempt):
+                return False
+            attempt += 1
+        return True
 
     def release(self):
         """
         尝试释放锁，成功时返回True，失败时则返回False。
+        释放成功时会唤醒一个正在等待这个锁的调用者。
         """
-        return self.client.delete(self.key) == 1
-    
+        return self.release_script(keys=[self.key, self.notify_key], args=[NOTIFY_TTL]) == 1
+
 
 if __name__ == '__main__':
   import os
@@ -30,5 +93,9 @@ if __name__ == '__main__':
   locker = Lock(client, "Lock:10086")
 
   assert locker.acquire()
-  
+
+  assert locker.release()
+
+  assert locker.acquire()
+  assert not locker.acquire(blocking=True, timeout=0.1)
   assert locker.release()
\ No newline at end of file
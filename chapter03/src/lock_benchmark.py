@@ -0,0 +1,66 @@
+import os
+import random
+import threading
+import time
+
+from redis import Redis
+
+from lock import Lock
+
+CONTENDERS = [1, 4, 16, 64, 256]
+DURATION = 2
+# 自行编写的“失败就睡一会儿再试”循环使用的睡眠时长上限，单位为秒
+SPIN_INTERVAL = 0.01
+
+host = os.getenv("REDIS_HOST") if os.getenv("REDIS_HOST") else "localhost"
+client = Redis(host, max_connections=1024)
+
+
+def spin_acquire(lock, deadline):
+    # 改造之前调用者只能自行编写的重试循环
+    while not lock.acquire():
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(random.uniform(0, SPIN_INTERVAL))
+    return True
+
+
+def blocking_acquire(lock, deadline):
+    return lock.acquire(blocking=True, timeout=max(deadline - time.monotonic(), 0))
+
+
+def contend(acquire, contenders):
+    """
+    让contenders个线程在DURATION秒内反复争抢同一个锁，
+    返回每秒成功加锁的次数以及等待时长的p99，单位为毫秒。
+    """
+    key = "Bench:Lock"
+    client.delete(key)
+    waits = []
+    deadline = time.monotonic() + DURATION
+
+    def worker():
+        lock = Lock(client, key)
+        while time.monotonic() < deadline:
+            start = time.monotonic()
+            if not acquire(lock, deadline):
+                break
+            waits.append(time.monotonic() - start)
+            lock.release()
+
+    threads = [threading.Thread(target=worker) for _ in range(contenders)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    waits.sort()
+    p99 = waits[int(len(waits) * 0.99) - 1] * 1000 if waits else 0
+    return len(waits) / DURATION, p99
+
+
+print(f"{'contenders':>10} {'spin acq/s':>11} {'spin p99':>9} {'block acq/s':>12} {'block p99':>10}")
+for contenders in CONTENDERS:
+    spin_rate, spin_p99 = contend(spin_acquire, contenders)
+    block_rate, block_p99 = contend(blocking_acquire, contenders)
+    print(f"{contenders:>10} {spin_rate:>11.0f} {spin_p99:>9.2f} {block_rate:>12.0f} {block_p99:>10.2f}")
@@ -0,0 +1,135 @@
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# 各个节点的时钟漂移系数，按照加锁时长的比例估算
+CLOCK_DRIFT_FACTOR = 0.01
+# 为时钟漂移额外预留的固定时长，单位为毫秒
+CLOCK_DRIFT_MARGIN = 2
+# 等待各个节点回复的最长时长，单位为毫秒，应当远小于锁的加锁时长
+# 超时仍未回复的节点视为操作失败，避免一个无响应的节点拖住整个加锁或者释放过程
+DEFAULT_NODE_TIMEOUT = 50
+
+# 仅当锁的值仍然是自己设置的令牌时才删除锁
+RELEASE_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+
+class RedLock:
+
+    def __init__(self, clients, key, node_timeout=DEFAULT_NODE_TIMEOUT):
+        """
+        创建一个横跨多个独立Redis节点的锁，clients为连接各个节点的客户端。
+        只要多数节点正常工作，单个节点宕机就不会让锁失效或者无法获取。
+        node_timeout为等待各个节点回复的最长时长，单位为毫秒。
+        客户端也应当设置较短的socket_timeout，否则发往无响应节点的命令会一直占用后台线程。
+        """
+        self.clients = clients
+        self.key = key
+        self.node_timeout = node_timeout
+        self.quorum = len(clients) // 2 + 1
+        self.token = None
+        self.validity = 0
+        self.release_scripts = [client.register_script(RELEASE_SCRIPT) for client in clients]
+        self.executor = ThreadPoolExecutor(len(clients), thread_name_prefix="redlock")
+
+    def acquire(self, timeout, unit="sec"):
+        """
+        尝试在多数节点上获取一个能够在指定时长之后自动释放的锁，成功时返回True，失败时返回False。
+        timeout参数用于设置锁的最大加锁时长。
+        可选的unit参数则用于设置时长的单位，
+        它的值可以是代表秒的'sec'或是代表毫秒的'ms'，默认为'sec'。
+        加锁成功之后，锁的剩余有效时长（已扣除加锁耗时和时钟漂移）可以通过validity属性获得，单位为毫秒。
+        锁已经由这个对象持有时引发RuntimeError，需要先调用release()。
+        """
+        if self.token is not None:
+            raise RuntimeError("Lock {} is already held, release it first".format(self.key))
+        if unit == "sec":
+            timeout_ms = int(timeout * 1000)
+        elif unit == "ms":
+            timeout_ms = int(timeout)
+        else:
+            raise ValueError("Unit must be 'sec' or 'ms'!")
+        token = secrets.token_hex(16)
+        start = time.monotonic()
+        acquired = self._on_all_nodes(lambda index: self._acquire_on(index, token, timeout_ms))
+        elapsed = (time.monotonic() - start) * 1000
+        drift = timeout_ms * CLOCK_DRIFT_FACTOR + CLOCK_DRIFT_MARGIN
+        validity = timeout_ms - elapsed - drift
+        if acquired >= self.quorum and validity > 0:
+            self.token = token
+            self.validity = validity
+            return True
+        # 没有获得多数节点或者锁在获取过程中已经失效：撤销已经加上的锁
+        self._release_all(token)
+        return False
+
+    def release(self):
+        """
+        在所有节点上并行地释放锁，只有锁仍然由自己持有的节点才会删除锁。
+        成功时返回True，锁已经在多数节点上过期或者被他人获取时返回False。
+        """
+        if self.token is None:
+            return False
+        token, self.token = self.token, None
+        self.validity = 0
+        return self._release_all(token) >= self.quorum
+
+    def _acquire_on(self, index, token, timeout_ms):
+        try:
+            return self.clients[index].set(self.key, token, nx=True, px=timeout_ms) is True
+        except Exception:
+            # 无法访问的节点视为加锁失败
+            return False
+
+    def _release_on(self, index, token):
+        try:
+            return self.release_scripts[index](keys=[self.key], args=[token]) == 1
+        except Exception:
+            return False
+
+    def _release_all(self, token):
+        return self._on_all_nodes(lambda index: self._release_on(index, token))
+
+    def _on_all_nodes(self, call):
+        # 在所有节点上并行地执行call，返回在node_timeout之内成功的节点数量
+        futures = [self.executor.submit(call, index) for index in range(len(self.clients))]
+        done, _ = wait(futures, timeout=self.node_timeout / 1000)
+        return sum(future.result() for future in done)
+
+
+if __name__ == "__main__":
+    import os
+
+    from redis import Redis
+
+    # 以逗号分隔的多个独立节点，例如：localhost:6380,localhost:6381,localhost:6382
+    nodes = os.getenv("REDLOCK_NODES", "localhost:6380,localhost:6381,localhost:6382")
+    clients = [Redis(*node.split(":"), socket_timeout=0.1) for node in nodes.split(",")]
+
+    lock = RedLock(clients, "Lock:10089")
+    other = RedLock(clients, "Lock:10089")
+
+    assert lock.acquire(5)
+    assert 0 < lock.validity < 5000
+    assert not other.acquire(5)
+    # 持有锁时再次加锁会引发异常，而不是覆盖之前的令牌
+    try:
+        lock.acquire(5)
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("acquire() must not overwrite a held lock")
+    assert lock.release()
+    assert other.acquire(500, "ms")
+
+    # 少数节点上的残留锁不会阻止获取锁
+    assert other.release()
+    clients[0].set("Lock:10089", "stale", px=5000)
+    assert lock.acquire(5)
+    assert lock.release()
+    clients[0].delete("Lock:10089")
@@ -0,0 +1,105 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+from async_lock import complete_acquire, notify_release, wait_for_release
+from identity_lock import EXTEND_SCRIPT, RELEASE_SCRIPT
+
+
+class AsyncIdentityLock:
+
+    def __init__(self, client, key):
+        """
+        创建一个使用redis.asyncio客户端的带密码保护的锁，用法与IdentityLock相同。
+        """
+        self.client = client
+        self.key = key
+        self.release_script = client.register_script(RELEASE_SCRIPT)
+        self.extend_script = client.register_script(EXTEND_SCRIPT)
+
+    async def acquire(self, password, blocking=False, timeout=None):
+        """
+        尝试获取一个带有密码保护功能的锁，
+        成功时返回True，失败时则返回False。
+        password参数用于设置上锁/解锁密码。
+        blocking为True时，锁被占用的调用者会在不阻塞事件循环的情况下等待，
+        可选的timeout参数用于设置最长等待时间，单位为秒，为None时一直等待。
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        attempt = 0
+        while not await complete_acquire(
+            self.client.set(self.key, password, nx=True), lambda: self.release(password)
+        ):
+            if not blocking or not await wait_for_release(self.key, deadline, attempt):
+                return False
+            attempt += 1
+        return True
+
+    async def release(self, password):
+        """
+        根据给定的密码，尝试释放锁。
+        锁存在并且密码正确时返回True，
+        返回False则表示密码不正确或者锁已不存在。
+        """
+        if await self.release_script(keys=[self.key], args=[password]) != 1:
+            return False
+        notify_release(self.key)
+        return True
+
+    async def extend(self, password, timeout, unit="sec"):
+        """
+        根据给定的密码，为锁设置新的过期时间，参数的含义与IdentityLock.extend()相同。
+        """
+        if unit == "sec":
+            timeout_ms = int(timeout * 1000)
+        elif unit == "ms":
+            timeout_ms = int(timeout)
+        else:
+            raise ValueError("Unit must be 'sec' or 'ms'!")
+        return await self.extend_script(keys=[self.key], args=[password, timeout_ms]) == 1
+
+    @asynccontextmanager
+    async def locked(self, password, timeout=None):
+        """
+        在async with语句中以给定的密码持有锁，timeout为最长等待时间，单位为秒。
+        等待超时将引发TimeoutError；离开语句块时总会释放锁，即使协程已经被取消。
+        """
+        if not await self.acquire(password, blocking=True, timeout=timeout):
+            raise TimeoutError("Timed out waiting for lock {}".format(self.key))
+        try:
+            yield self
+        finally:
+            await asyncio.shield(self.release(password))
+
+
+if __name__ == '__main__':
+    import os
+    from redis.asyncio import Redis
+
+    async def main():
+        host = os.getenv("REDIS_HOST") if os.getenv("REDIS_HOST") else "localhost"
+        client = Redis(host=host, decode_responses=True)
+
+        lock = AsyncIdentityLock(client, "lock:10087")
+
+        assert await lock.acquire("top-secret")
+        assert not await lock.acquire("wrong-secret")
+        assert not await lock.acquire("wrong-secret", blocking=True, timeout=0.1)
+        assert await lock.extend("top-secret", 10)
+        assert not await lock.release("wrong-secret")
+        assert await lock.release("top-secret")
+
+        # 多个协程以各自的密码轮流持有锁
+        holders = []
+
+        async def worker(password):
+            async with lock.locked(password):
+                holders.append(password)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(worker(str(i)) for i in range(20)))
+        assert sorted(holders) == sorted(str(i) for i in range(20))
+
+        await client.aclose()
+
+    asyncio.run(main())
@@ -1,10 +1,28 @@
-from redis import WatchError
+# 仅当锁键存储的密码与给定密码一致时才删除锁
+RELEASE_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+# 仅当锁键存储的密码与给定密码一致时才设置锁的过期时间
+EXTEND_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("PEXPIRE", KEYS[1], ARGV[2])
+end
+return 0
+"""
 
 class IdentityLock:
 
     def __init__(self, client, key):
         self.client = client
         self.key = key
+        # register_script()返回的对象按SHA1使用EVALSHA执行脚本，
+        # 服务器的脚本缓存被清空时会自动重新载入脚本
+        self.release_script = client.register_script(RELEASE_SCRIPT)
+        self.extend_script = client.register_script(EXTEND_SCRIPT)
 
     def acquire(self, password):
         """
@@ -20,29 +38,25 @@ class IdentityLock:
         锁存在并且密码正确时返回True，
         返回False则表示密码不正确或者锁已不存在。
         """
-        tx = self.client.pipeline()
-        try:
-            # 监视锁键以防它发生变化
-            tx.watch(self.key)
-            # 获取锁键存储的密码
-            lock_password = tx.get(self.key)
-            # 比对密码
-            if lock_password == password:
-                # 情况1：密码正确，尝试解锁
-                tx.multi()
-                tx.delete(self.key)
-                return tx.execute()[0]==1  # 返回删除结果
-            else:
-                # 情况2：密码不正确
-                tx.unwatch()
-        except WatchError:
-            # 尝试解锁时发现键已变化
-            pass
-        finally:
-            # 确保连接正确回归连接池，redis-py的要求
-            tx.reset()
-        # 密码不正确或者尝试解锁时失败
-        return False
+        # 比对密码和删除锁在服务器端一次完成，既不会因为WatchError而失败，也只需要一次往返
+        return self.release_script(keys=[self.key], args=[password]) == 1
+
+    def extend(self, password, timeout, unit="sec"):
+        """
+        根据给定的密码，为锁设置新的过期时间。
+        timeout参数用于设置锁的剩余时长，
+        可选的unit参数则用于设置时长的单位，
+        它的值可以是代表秒的'sec'或是代表毫秒的'ms'，默认为'sec'。
+        锁存在并且密码正确时返回True，
+        返回False则表示密码不正确或者锁已不存在。
+        """
+        if unit == "sec":
+            timeout_ms = int(timeout * 1000)
+        elif unit == "ms":
+            timeout_ms = int(timeout)
+        else:
+            raise ValueError("Unit must be 'sec' or 'ms'!")
+        return self.extend_script(keys=[self.key], args=[password, timeout_ms]) == 1
 
 if __name__ == '__main__':
     import os
@@ -57,5 +71,14 @@ if __name__ == '__main__':
 
     assert not lock.acquire("wrong-secret")
 
+    assert lock.extend("top-secret", 10)
+    assert not lock.extend("wrong-secret", 10)
+    assert 0 < client.ttl("lock:10086") <= 10
+
+    assert not lock.release("wrong-secret")
+
+    # 脚本缓存被清空之后仍然可以正常释放锁
+    client.script_flush()
     assert lock.release("top-secret")
+    assert not lock.release("top-secret")
 
@@ -0,0 +1,90 @@
+import os
+import threading
+import time
+
+from redis import Redis, WatchError
+
+from identity_lock import IdentityLock
+
+CONTENDERS = [1, 8, 32]
+ROUNDS = 200
+# 获取锁失败时重试的间隔，单位为秒
+RETRY_INTERVAL = 0.001
+# 模拟的看门狗为锁续期的间隔，单位为秒
+RENEW_INTERVAL = 0.001
+
+host = os.getenv("REDIS_HOST") if os.getenv("REDIS_HOST") else "localhost"
+client = Redis(host=host, decode_responses=True, max_connections=256)
+
+
+def watch_release(lock, password):
+    # 改造之前的实现：WATCH、GET、MULTI、DEL、EXEC
+    tx = lock.client.pipeline()
+    try:
+        tx.watch(lock.key)
+        if tx.get(lock.key) == password:
+            tx.multi()
+            tx.delete(lock.key)
+            return tx.execute()[0] == 1
+        tx.unwatch()
+    except WatchError:
+        pass
+    finally:
+        tx.reset()
+    return False
+
+
+def script_release(lock, password):
+    return lock.release(password)
+
+
+def run(release, contenders):
+    """
+    让contenders个线程轮流获取并释放同一个锁，同时有一个线程不断为锁续期，
+    模拟持有者的看门狗：续期会修改锁键，从而让WATCH版本的释放操作失败。
+    返回释放操作的平均延迟、p99延迟（毫秒）以及成功率。
+    """
+    key = "Bench:IdentityLock"
+    client.delete(key)
+    latencies = []
+    successes = []
+    stopped = threading.Event()
+
+    def renewer():
+        while not stopped.wait(RENEW_INTERVAL):
+            client.pexpire(key, 10000)
+
+    def worker(password):
+        lock = IdentityLock(client, key)
+        for _ in range(ROUNDS):
+            while not lock.acquire(password):
+                time.sleep(RETRY_INTERVAL)
+            start = time.perf_counter()
+            released = release(lock, password)
+            latencies.append(time.perf_counter() - start)
+            successes.append(released)
+            if not released:
+                # 释放失败的锁只能等待清理，这里直接删除以便继续测试
+                client.delete(key)
+
+    watchdog = threading.Thread(target=renewer)
+    watchdog.start()
+    threads = [threading.Thread(target=worker, args=(str(i),)) for i in range(contenders)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stopped.set()
+    watchdog.join()
+
+    latencies.sort()
+    mean = sum(latencies) / len(latencies) * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    return mean, p99, sum(successes) / len(successes)
+
+
+print(f"{'contenders':>10} {'method':>7} {'mean ms':>8} {'p99 ms':>7} {'success':>8}")
+for contenders in CONTENDERS:
+    for name, release in [("watch", watch_release), ("script", script_release)]:
+        mean, p99, rate = run(release, contenders)
+        print(f"{contenders:>10} {name:>7} {mean:>8.3f} {p99:>7.3f} {rate:>8.1%}")
@@ -0,0 +1,161 @@
+from semaphore import PREAMBLE, acquire_in_order, make_queue_keys, to_milliseconds
+
+# KEYS[1]为读者集合，KEYS[5]为写者
+# 只要没有写者持有锁，并且队列中没有排在自己前面的写者，读者就可以获取锁
+ACQUIRE_READ_SCRIPT = PREAMBLE + """
+local member = "r:" .. ARGV[1]
+if redis.call("EXISTS", KEYS[5]) == 0 then
+    local rank = redis.call("ZRANK", KEYS[2], member)
+    local ahead = {}
+    if not rank then
+        ahead = redis.call("ZRANGE", KEYS[2], 0, -1)
+    elseif rank > 0 then
+        ahead = redis.call("ZRANGE", KEYS[2], 0, rank - 1)
+    end
+    for _, waiter in ipairs(ahead) do
+        if string.sub(waiter, 1, 2) == "w:" then
+            return enqueue(member)
+        end
+    end
+    redis.call("ZADD", KEYS[1], now + tonumber(ARGV[2]), ARGV[1])
+    dequeue(member)
+    return 1
+end
+return enqueue(member)
+"""
+
+# 只有在没有任何读者和写者，并且自己排在队首（或者队列为空）时，写者才可以获取锁
+ACQUIRE_WRITE_SCRIPT = PREAMBLE + """
+local member = "w:" .. ARGV[1]
+local writer = redis.call("GET", KEYS[5])
+if writer == ARGV[1] then
+    redis.call("PEXPIRE", KEYS[5], ARGV[2])
+    return 1
+end
+if not writer and redis.call("ZCARD", KEYS[1]) == 0 then
+    local rank = redis.call("ZRANK", KEYS[2], member)
+    if rank == 0 or (not rank and redis.call("ZCARD", KEYS[2]) == 0) then
+        redis.call("SET", KEYS[5], ARGV[1], "PX", ARGV[2])
+        dequeue(member)
+        return 1
+    end
+end
+return enqueue(member)
+"""
+
+# 仅当写者仍然是给定的身份时才释放写锁
+RELEASE_WRITE_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+
+def make_readers_key(key):
+    """
+    构建记录读者及其过期时间的有序集合键。
+    例子：RWLock:10086:readers
+    """
+    return "{}:readers".format(key)
+
+
+def make_writer_key(key):
+    """
+    构建记录写者身份的键。
+    例子：RWLock:10086:writer
+    """
+    return "{}:writer".format(key)
+
+
+class RWLock:
+
+    def __init__(self, client, key):
+        """
+        创建一个读写锁：多个读者可以同时持有读锁，写锁则只能由一个写者独占。
+        等待中的读者和写者按照先来后到的顺序获得锁，
+        排队的写者会阻止后来的读者插队，因此写者不会被源源不断的读者饿死。
+        """
+        self.client = client
+        self.key = key
+        self.readers_key = make_readers_key(key)
+        self.writer_key = make_writer_key(key)
+        self.keys = [self.readers_key, *make_queue_keys(key), self.writer_key]
+        self.acquire_read_script = client.register_script(ACQUIRE_READ_SCRIPT)
+        self.acquire_write_script = client.register_script(ACQUIRE_WRITE_SCRIPT)
+        self.release_write_script = client.register_script(RELEASE_WRITE_SCRIPT)
+
+    def acquire_read(self, identity, timeout, unit="sec", blocking=False, wait_timeout=None):
+        """
+        尝试以给定的身份获取读锁，成功时返回True，失败时则返回False。
+        timeout参数用于设置锁的最大持有时长，持有者崩溃时锁会在这段时间之后被自动回收。
+        可选的unit参数用于设置时长的单位，可以是'sec'或'ms'，默认为'sec'。
+        blocking为True时，调用者会排队等待锁，
+        可选的wait_timeout参数用于设置最长等待时间，单位为秒，为None时一直等待。
+        """
+        return acquire_in_order(
+            self.client, self.acquire_read_script, self.keys, "r:" + identity,
+            [identity, to_milliseconds(timeout, unit)], blocking, wait_timeout,
+        )
+
+    def release_read(self, identity):
+        """
+        释放给定身份持有的读锁。
+        成功时返回True，返回False则表示该身份并未持有读锁或者锁已经过期。
+        """
+        return self.client.zrem(self.readers_key, identity) == 1
+
+    def acquire_write(self, identity, timeout, unit="sec", blocking=False, wait_timeout=None):
+        """
+        尝试以给定的身份获取写锁，成功时返回True，失败时则返回False。
+        各个参数的含义与acquire_read()相同。
+        """
+        return acquire_in_order(
+            self.client, self.acquire_write_script, self.keys, "w:" + identity,
+            [identity, to_milliseconds(timeout, unit)], blocking, wait_timeout,
+        )
+
+    def release_write(self, identity):
+        """
+        释放给定身份持有的写锁。
+        成功时返回True，返回False则表示写锁并非由该身份持有或者锁已经过期。
+        """
+        return self.release_write_script(keys=[self.writer_key], args=[identity]) == 1
+
+
+if __name__ == "__main__":
+    import os
+    import threading
+    import time
+
+    from redis import Redis
+
+    host = os.getenv("REDIS_HOST") if os.getenv("REDIS_HOST") else "localhost"
+    client = Redis(host=host, decode_responses=True)
+
+    lock = RWLock(client, "RWLock:10086")
+
+    # 读者之间可以共享锁，写者则需要等待全部读者离开
+    assert lock.acquire_read("peter", 5)
+    assert lock.acquire_read("jack", 5)
+    assert not lock.acquire_write("tom", 5)
+
+    # 排队中的写者会阻止后来的读者插队
+    writer = threading.Thread(target=lock.acquire_write, args=("tom", 5, "sec", True, 2))
+    writer.start()
+    time.sleep(0.2)
+    assert not lock.acquire_read("mary", 5)
+    assert lock.release_read("peter")
+    assert lock.release_read("jack")
+    writer.join()
+
+    assert not lock.acquire_read("mary", 5)
+    assert not lock.release_write("peter")
+    assert lock.release_write("tom")
+    assert lock.acquire_read("mary", 5)
+    assert lock.release_read("mary")
+
+    # 崩溃的写者持有的锁会在持有时长结束时被自动回收
+    assert lock.acquire_write("tom", 100, "ms")
+    assert lock.acquire_read("mary", 5, blocking=True, wait_timeout=1)
+    assert lock.release_read("mary")
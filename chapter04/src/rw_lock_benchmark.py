@@ -0,0 +1,68 @@
+import os
+import random
+import threading
+import time
+
+from redis import Redis
+
+from identity_lock import IdentityLock
+from rw_lock import RWLock
+
+WORKERS = 32
+DURATION = 2
+# 持有锁期间模拟的读写操作耗时，单位为秒
+HOLD_TIME = 0.002
+# IdentityLock不支持阻塞等待，获取失败时重试的间隔，单位为秒
+RETRY_INTERVAL = 0.001
+READ_RATIOS = [0.5, 0.9, 0.99]
+
+host = os.getenv("REDIS_HOST") if os.getenv("REDIS_HOST") else "localhost"
+client = Redis(host=host, decode_responses=True, max_connections=256)
+
+
+def exclusive(identity, is_read):
+    # 无论读写都需要独占整个资源
+    lock = IdentityLock(client, "Bench:IdentityLock")
+    while not lock.acquire(identity):
+        time.sleep(RETRY_INTERVAL)
+    time.sleep(HOLD_TIME)
+    lock.release(identity)
+
+
+def shared(identity, is_read):
+    lock = RWLock(client, "Bench:RWLock")
+    if is_read:
+        lock.acquire_read(identity, 10, blocking=True)
+        time.sleep(HOLD_TIME)
+        lock.release_read(identity)
+    else:
+        lock.acquire_write(identity, 10, blocking=True)
+        time.sleep(HOLD_TIME)
+        lock.release_write(identity)
+
+
+def run(operation, read_ratio):
+    """
+    让WORKERS个线程在DURATION秒内按照给定的读比例反复执行加锁操作，返回每秒完成的操作数。
+    """
+    completed = []
+    deadline = time.monotonic() + DURATION
+
+    def worker(identity):
+        count = 0
+        while time.monotonic() < deadline:
+            operation(identity, random.random() < read_ratio)
+            count += 1
+        completed.append(count)
+
+    threads = [threading.Thread(target=worker, args=(str(i),)) for i in range(WORKERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(completed) / DURATION
+
+
+print(f"{'read ratio':>10} {'IdentityLock ops/s':>19} {'RWLock ops/s':>13}")
+for ratio in READ_RATIOS:
+    print(f"{ratio:>10} {run(exclusive, ratio):>19.0f} {run(shared, ratio):>13.0f}")
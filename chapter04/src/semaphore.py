@@ -0,0 +1,157 @@
+import time
+
+# 阻塞等待时重新尝试获取的间隔，单位为秒
+WAIT_INTERVAL = 0.01
+# 等待者在队列中的存活时间，单位为毫秒
+# 等待者每次重试都会续期，崩溃的等待者会在这段时间之后被移出队列，不再阻挡后来者
+WAITER_TTL = 1000
+
+# 公共的脚本片段：
+# KEYS[1]为持有者集合，KEYS[2]为等待队列，KEYS[3]为等待者的过期时间，KEYS[4]为排队号码
+# ARGV[1]为持有者身份，ARGV[2]为加锁时长，ARGV[3]为是否排队等待，ARGV[4]为等待者的存活时间
+# 使用服务器时间清理已经过期的持有者和等待者，避免依赖各个客户端的时钟
+PREAMBLE = """
+local time = redis.call("TIME")
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+redis.call("ZREMRANGEBYSCORE", KEYS[1], "-inf", now)
+local expired = redis.call("ZRANGEBYSCORE", KEYS[3], "-inf", now)
+for _, waiter in ipairs(expired) do
+    redis.call("ZREM", KEYS[2], waiter)
+end
+redis.call("ZREMRANGEBYSCORE", KEYS[3], "-inf", now)
+
+local function enqueue(member)
+    if ARGV[3] == "1" then
+        if not redis.call("ZSCORE", KEYS[2], member) then
+            redis.call("ZADD", KEYS[2], redis.call("INCR", KEYS[4]), member)
+        end
+        redis.call("ZADD", KEYS[3], now + tonumber(ARGV[4]), member)
+    end
+    return 0
+end
+
+local function dequeue(member)
+    redis.call("ZREM", KEYS[2], member)
+    redis.call("ZREM", KEYS[3], member)
+end
+"""
+
+# ARGV[5]为许可的数量
+# 排在队列前面的等待者优先获得空闲的许可，不在队列中的调用者排在队尾之后
+ACQUIRE_SCRIPT = PREAMBLE + """
+local member = ARGV[1]
+if redis.call("ZSCORE", KEYS[1], member) then
+    redis.call("ZADD", KEYS[1], now + tonumber(ARGV[2]), member)
+    return 1
+end
+local rank = redis.call("ZRANK", KEYS[2], member)
+if not rank then
+    rank = redis.call("ZCARD", KEYS[2])
+end
+if rank < tonumber(ARGV[5]) - redis.call("ZCARD", KEYS[1]) then
+    redis.call("ZADD", KEYS[1], now + tonumber(ARGV[2]), member)
+    dequeue(member)
+    return 1
+end
+return enqueue(member)
+"""
+
+
+def to_milliseconds(timeout, unit):
+    if unit == "sec":
+        return int(timeout * 1000)
+    elif unit == "ms":
+        return int(timeout)
+    else:
+        raise ValueError("Unit must be 'sec' or 'ms'!")
+
+
+def make_queue_keys(key):
+    """
+    构建等待队列、等待者过期时间以及排队号码使用的键。
+    例子：Semaphore:10086:queue、Semaphore:10086:queue:ttl、Semaphore:10086:ticket
+    """
+    return ["{}:queue".format(key), "{}:queue:ttl".format(key), "{}:ticket".format(key)]
+
+
+def acquire_in_order(client, script, keys, member, args, blocking, wait_timeout):
+    """
+    执行给定的加锁脚本，blocking为True时在队列中排队并不断重试，
+    直到加锁成功或者等待超过wait_timeout秒为止；等待超时的调用者会被移出队列。
+    """
+    deadline = None if wait_timeout is None else time.monotonic() + wait_timeout
+    while True:
+        if script(keys=keys, args=[args[0], args[1], int(blocking), WAITER_TTL, *args[2:]]) == 1:
+            return True
+        if not blocking:
+            return False
+        if deadline is not None and time.monotonic() >= deadline:
+            tx = client.pipeline(transaction=False)
+            tx.zrem(keys[1], member)
+            tx.zrem(keys[2], member)
+            tx.execute()
+            return False
+        time.sleep(WAIT_INTERVAL)
+
+
+class Semaphore:
+
+    def __init__(self, client, key, limit):
+        """
+        创建一个最多允许limit个持有者同时持有的信号量。
+        """
+        self.client = client
+        self.key = key
+        self.limit = limit
+        self.keys = [key, *make_queue_keys(key)]
+        self.acquire_script = client.register_script(ACQUIRE_SCRIPT)
+
+    def acquire(self, identity, timeout, unit="sec", blocking=False, wait_timeout=None):
+        """
+        尝试以给定的身份获取一个许可，成功时返回True，失败时则返回False。
+        timeout参数用于设置许可的最大持有时长，持有者崩溃时许可会在这段时间之后被自动回收；
+        已经持有许可的身份再次获取时会刷新持有时长。
+        可选的unit参数用于设置时长的单位，可以是'sec'或'ms'，默认为'sec'。
+        blocking为True时，调用者会按照先来后到的顺序排队等待空闲的许可，
+        可选的wait_timeout参数用于设置最长等待时间，单位为秒，为None时一直等待。
+        """
+        return acquire_in_order(
+            self.client, self.acquire_script, self.keys, identity,
+            [identity, to_milliseconds(timeout, unit), self.limit], blocking, wait_timeout,
+        )
+
+    def release(self, identity):
+        """
+        释放给定身份持有的许可。
+        成功时返回True，返回False则表示该身份并未持有许可或者许可已经过期。
+        """
+        return self.client.zrem(self.key, identity) == 1
+
+
+if __name__ == "__main__":
+    import os
+    from redis import Redis
+
+    host = os.getenv("REDIS_HOST") if os.getenv("REDIS_HOST") else "localhost"
+    client = Redis(host=host, decode_responses=True)
+
+    semaphore = Semaphore(client, "Semaphore:10086", 2)
+
+    assert semaphore.acquire("peter", 5)
+    assert semaphore.acquire("jack", 5)
+    assert not semaphore.acquire("tom", 5)
+    assert not semaphore.acquire("tom", 5, blocking=True, wait_timeout=0.1)
+
+    assert semaphore.release("peter")
+    assert not semaphore.release("peter")
+    assert semaphore.acquire("tom", 5)
+
+    assert not semaphore.acquire("mary", 5, blocking=True, wait_timeout=0.5)
+    assert semaphore.release("jack")
+
+    # 持有者崩溃之后，许可会在持有时长结束时被自动回收
+    assert semaphore.acquire("mary", 100, "ms")
+    time.sleep(0.2)
+    assert semaphore.acquire("peter", 5)
+    assert semaphore.release("peter")
+    assert semaphore.release("tom")
@@ -1,14 +1,65 @@
+import threading
+
+
 class HashIdGenerator:
 
-    def __init__(self, client, key):
+    def __init__(self, client, key, block_size=1):
+        """
+        创建一个在散列中存储多个ID序列的生成器。
+        block_size大于1时，生成器每次为一个序列申请一整个区间的ID并在本地逐个分配，
+        此时ID只在同一个生成器内部递增，并且进程退出时尚未分配的ID将被跳过。
+        """
         self.client = client
         self.key = key
+        self.block_size = block_size
+        # 序列名字 -> [区间中下一个待分配的ID, 区间的最后一个ID]
+        self.blocks = {}
+        self.lock = threading.Lock()
 
     def produce(self, name):
         """
         生成并返回下一个ID。
         """
-        return self.client.hincrby(self.key, name, 1)
+        if self.block_size == 1:
+            return self.client.hincrby(self.key, name, 1)
+        return self.produce_many({name: 1})[name][0]
+
+    def produce_many(self, counts):
+        """
+        一次为多个序列生成ID，counts为序列名字到所需ID数量的映射。
+        返回序列名字到连续ID区间（range对象）的映射，
+        所有需要访问Redis的序列只需要一次往返。
+        """
+        with self.lock:
+            result = {}
+            missing = {}
+            for name, count in counts.items():
+                if count <= 0:
+                    result[name] = range(0)
+                    continue
+                block = self.blocks.get(name)
+                if block is not None and block[1] - block[0] + 1 >= count:
+                    result[name] = range(block[0], block[0] + count)
+                    block[0] += count
+                else:
+                    # 本地区间不足时直接申请新的区间，旧区间剩余的ID将被跳过
+                    missing[name] = count
+        if not missing:
+            return result
+        # 访问Redis期间不持有锁，其他线程仍然可以从本地区间分配ID
+        tx = self.client.pipeline(transaction=False)
+        for name, count in missing.items():
+            tx.hincrby(self.key, name, max(count, self.block_size))
+        last_ids = tx.execute()
+        with self.lock:
+            for (name, count), last_id in zip(missing.items(), last_ids):
+                first_id = last_id - max(count, self.block_size) + 1
+                result[name] = range(first_id, first_id + count)
+                block = self.blocks.get(name)
+                # 其他线程可能同时申请到了更新的区间，只保留较新的区间，保证ID在生成器内部递增
+                if self.block_size > 1 and (block is None or block[1] < last_id):
+                    self.blocks[name] = [first_id + count, last_id]
+        return result
 
     def reserve(self, name, number):
         """
@@ -33,3 +84,19 @@ if __name__ == "__main__":
     assert g.produce("post-id") == 1000001
 
     assert g.produce("post-id") == 1000002
+
+    # 一次往返为多个序列生成ID
+    ids = g.produce_many({"post-id": 2, "comment-id": 3})
+    assert ids["post-id"] == range(1000003, 1000005)
+    assert list(ids["comment-id"]) == [1, 2, 3]
+
+    # 按区间申请ID，区间用完之前不需要访问Redis
+    r.delete("order-id-coll")
+    g = HashIdGenerator(r, "order-id-coll", block_size=100)
+    assert g.produce("order-id") == 1
+    assert g.produce_many({"order-id": 2, "item-id": 5}) == {"order-id": range(2, 4), "item-id": range(1, 6)}
+    assert r.hget("order-id-coll", "order-id") == "100"
+    assert g.produce_many({"order-id": 200})["order-id"] == range(101, 301)
+    # 数量为0的序列不会申请任何ID
+    assert g.produce_many({"order-id": 0, "user-id": 0}) == {"order-id": range(0), "user-id": range(0)}
+    assert r.hget("order-id-coll", "user-id") is None
@@ -1,14 +1,48 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# 当前区间剩余的ID少于区间大小的这个比例时，在后台预先申请下一个区间
+PREFETCH_RATIO = 0.2
+
+
 class IdGenerator:
 
-    def __init__(self, client, name):
+    def __init__(self, client, name, block_size=1):
+        """
+        创建一个ID生成器。
+        block_size大于1时，生成器每次通过INCRBY向Redis申请一整个区间的ID，
+        然后在本地逐个分配，从而把每个ID一次往返变为每个区间一次往返。
+        此时各个生成器分配的ID仍然唯一，但只在同一个生成器内部递增，
+        并且进程退出时尚未分配的ID将被跳过。
+        """
         self.client = client
         self.name = name
+        self.block_size = block_size
+        # 当前区间中下一个待分配的ID以及区间的最后一个ID
+        self.next_id = 1
+        self.last_id = 0
+        # 正在后台申请的下一个区间
+        self.prefetched = None
+        self.lock = threading.Lock()
+        # 用于预先申请区间的线程池，首次使用时才创建
+        self.prefetcher = None
 
     def produce(self):
         """
         生成并返回下一个ID。
         """
-        return self.client.incr(self.name)
+        if self.block_size == 1:
+            return self.client.incr(self.name)
+        with self.lock:
+            if self.next_id > self.last_id:
+                self._switch_block()
+            new_id = self.next_id
+            self.next_id += 1
+            if self.prefetched is None and self.last_id - new_id < self.block_size * PREFETCH_RATIO:
+                if self.prefetcher is None:
+                    self.prefetcher = ThreadPoolExecutor(1, thread_name_prefix="id-prefetch")
+                self.prefetched = self.prefetcher.submit(self._allocate)
+            return new_id
 
     def reserve(self, n):
         """
@@ -18,6 +52,22 @@ class IdGenerator:
         """
         return self.client.set(self.name, n, nx=True) is True
 
+    def _allocate(self):
+        # 申请一个区间，返回区间的最后一个ID
+        return self.client.incrby(self.name, self.block_size)
+
+    def _switch_block(self):
+        prefetched, self.prefetched = self.prefetched, None
+        try:
+            last_id = None if prefetched is None else prefetched.result()
+        except Exception:
+            # 后台申请失败（例如网络暂时中断），改为同步地重新申请
+            last_id = None
+        if last_id is None:
+            last_id = self._allocate()
+        self.next_id = last_id - self.block_size + 1
+        self.last_id = last_id
+
 if __name__ == '__main__':
     import os
     from redis import Redis
@@ -34,3 +84,21 @@ if __name__ == '__main__':
     assert g.produce() == 1000003
 
     assert not g.reserve(9999)
+
+    # 按区间申请ID，多个线程并发生成的ID互不重复
+    r.delete("order-id")
+    g = IdGenerator(r, "order-id", block_size=100)
+    assert g.reserve(1000000)
+    assert g.produce() == 1000001
+
+    ids = []
+    threads = [
+        threading.Thread(target=lambda: ids.extend(g.produce() for _ in range(1000)))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(ids)) == 8000
+    assert min(ids) == 1000002
@@ -0,0 +1,23 @@
+import os
+import time
+
+from redis import Redis
+
+from id_generator import IdGenerator
+
+BLOCK_SIZES = [1, 10, 100, 1000, 10000]
+DURATION = 2
+
+host = os.getenv("REDIS_HOST") if os.getenv("REDIS_HOST") else "localhost"
+client = Redis(host=host, decode_responses=True)
+
+print(f"{'block size':>10} {'ids/s':>12}")
+for block_size in BLOCK_SIZES:
+    client.delete("Bench:IdGenerator")
+    generator = IdGenerator(client, "Bench:IdGenerator", block_size)
+    count = 0
+    deadline = time.monotonic() + DURATION
+    while time.monotonic() < deadline:
+        generator.produce()
+        count += 1
+    print(f"{block_size:>10} {count / DURATION:>12.0f}")
@@ -0,0 +1,206 @@
+import secrets
+import threading
+import time
+
+from id_generator import IdGenerator
+
+# ID的布局：1位符号位（总为0）+ 41位毫秒时间戳 + 10位工作者ID + 12位序列号
+TIMESTAMP_BITS = 41
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKERS = 1 << WORKER_BITS
+SEQUENCE_MASK = (1 << SEQUENCE_BITS) - 1
+
+# 时间戳的起点，2024-01-01 00:00:00 UTC，单位为毫秒
+DEFAULT_EPOCH = 1704067200000
+
+# 工作者ID的租约时长，单位为毫秒，生成器每经过三分之一的租约时长就续期一次
+LEASE_TTL = 10000
+# 距离上次成功续期的时间超过LEASE_TTL减去这个余量时，生成器停止生成ID，单位为毫秒
+# 余量用于抵消网络延迟以及客户端与服务器之间的时钟速率差异，确保本地先于服务器认为租约失效
+LEASE_MARGIN = 2000
+# 能够容忍的最大时钟回拨，单位为毫秒
+# 回拨不超过这个时长时，生成器沿用上次的时间戳继续分配；超过时拒绝生成ID
+MAX_CLOCK_BACKWARD = 1000
+
+# 仅当租约仍然由自己持有时才续期或者删除租约
+RENEW_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("PEXPIRE", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+RELEASE_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+
+def make_worker_counter_key(name):
+    """
+    构建用于轮流挑选工作者ID的计数器键。
+    例子：order-id:workers
+    """
+    return "{}:workers".format(name)
+
+
+def make_lease_key(name, worker_id):
+    """
+    构建记录工作者ID租约的键。
+    例子：order-id:worker:7
+    """
+    return "{}:worker:{}".format(name, worker_id)
+
+
+def parse(snowflake_id, epoch=DEFAULT_EPOCH):
+    """
+    把ID拆分为生成时的Unix毫秒时间戳、工作者ID以及序列号。
+    """
+    timestamp = (snowflake_id >> (WORKER_BITS + SEQUENCE_BITS)) + epoch
+    worker_id = (snowflake_id >> SEQUENCE_BITS) & (MAX_WORKERS - 1)
+    return timestamp, worker_id, snowflake_id & SEQUENCE_MASK
+
+
+class SnowflakeGenerator:
+
+    def __init__(self, client, name, epoch=DEFAULT_EPOCH):
+        """
+        创建一个在本地生成64位ID的生成器，生成ID时不需要访问Redis。
+        Redis只负责以租约的形式为生成器分配一个独占的工作者ID，并由后台线程定期续期。
+        生成的ID按照时间大致有序，适合作为数据库索引的主键。
+        """
+        self.client = client
+        self.name = name
+        self.epoch = epoch
+        self.workers = IdGenerator(client, make_worker_counter_key(name))
+        self.renew_script = client.register_script(RENEW_SCRIPT)
+        self.release_script = client.register_script(RELEASE_SCRIPT)
+        self.token = secrets.token_hex(16)
+        self.lock = threading.Lock()
+        self.last_timestamp = -1
+        self.sequence = 0
+        # 最近一次成功获取或续期租约的时间，以发送命令之前的时刻为准
+        self.renewed_at = None
+        self.worker_id = self._lease()
+        self.stopped = threading.Event()
+        self.heartbeat = threading.Thread(target=self._renew, daemon=True)
+        self.heartbeat.start()
+
+    def produce(self):
+        """
+        生成并返回下一个ID。
+        """
+        with self.lock:
+            if self.worker_id is None:
+                raise RuntimeError("Worker ID lease for {} was lost".format(self.name))
+            if (time.monotonic() - self.renewed_at) * 1000 >= LEASE_TTL - LEASE_MARGIN:
+                # 长时间没有续期成功，租约可能已经在服务器上过期并被其他生成器获取
+                raise RuntimeError("Worker ID lease for {} could not be renewed".format(self.name))
+            timestamp = self._now()
+            if timestamp < self.last_timestamp:
+                backward = self.last_timestamp - timestamp
+                if backward > MAX_CLOCK_BACKWARD:
+                    raise RuntimeError("Clock moved backwards by {} ms".format(backward))
+                # 时钟回拨：沿用上次的时间戳，保证ID仍然递增
+                timestamp = self.last_timestamp
+            if timestamp == self.last_timestamp:
+                self.sequence = (self.sequence + 1) & SEQUENCE_MASK
+                if self.sequence == 0:
+                    # 同一毫秒内的序列号已经用完，等待时钟前进
+                    while timestamp <= self.last_timestamp:
+                        time.sleep(0.0001)
+                        timestamp = self._now()
+            else:
+                self.sequence = 0
+            self.last_timestamp = timestamp
+            return (
+                (timestamp << (WORKER_BITS + SEQUENCE_BITS))
+                | (self.worker_id << SEQUENCE_BITS)
+                | self.sequence
+            )
+
+    def close(self):
+        """
+        停止续期并归还工作者ID，之后生成器不能再生成ID。
+        """
+        self.stopped.set()
+        self.heartbeat.join()
+        with self.lock:
+            if self.worker_id is not None:
+                self.release_script(keys=[make_lease_key(self.name, self.worker_id)], args=[self.token])
+                self.worker_id = None
+
+    def _now(self):
+        return time.time_ns() // 1000000 - self.epoch
+
+    def _lease(self):
+        # 从计数器给出的位置开始依次尝试，直到租到一个空闲的工作者ID为止
+        start = self.workers.produce()
+        for offset in range(MAX_WORKERS):
+            worker_id = (start + offset) % MAX_WORKERS
+            sent_at = time.monotonic()
+            if self.client.set(make_lease_key(self.name, worker_id), self.token, nx=True, px=LEASE_TTL):
+                self.renewed_at = sent_at
+                return worker_id
+        raise RuntimeError("No free worker ID for {}".format(self.name))
+
+    def _renew(self):
+        while not self.stopped.wait(LEASE_TTL / 3 / 1000):
+            sent_at = time.monotonic()
+            try:
+                renewed = self.renew_script(
+                    keys=[make_lease_key(self.name, self.worker_id)], args=[self.token, LEASE_TTL]
+                ) == 1
+            except Exception:
+                # 网络抖动时继续尝试，租约真正过期之前还有机会续期成功；
+                # 在此期间produce()会根据renewed_at判断租约是否仍然可靠
+                continue
+            if renewed:
+                with self.lock:
+                    self.renewed_at = sent_at
+            else:
+                # 租约已经丢失，这个工作者ID可能正被其他生成器使用，停止生成ID
+                with self.lock:
+                    self.worker_id = None
+                return
+
+
+if __name__ == "__main__":
+    import os
+    from redis import Redis
+
+    host = os.getenv("REDIS_HOST") if os.getenv("REDIS_HOST") else "localhost"
+    r = Redis(host=host, decode_responses=True)
+
+    first = SnowflakeGenerator(r, "order-id")
+    second = SnowflakeGenerator(r, "order-id")
+    assert first.worker_id != second.worker_id
+
+    ids = [first.produce() for _ in range(10000)] + [second.produce() for _ in range(10000)]
+    assert len(set(ids)) == 20000
+    # 同一个生成器生成的ID严格递增
+    assert ids[:10000] == sorted(ids[:10000])
+
+    timestamp, worker_id, _ = parse(ids[-1])
+    assert worker_id == second.worker_id
+    assert abs(timestamp - time.time() * 1000) < 1000
+
+    # 小幅度的时钟回拨不会产生重复或者倒退的ID
+    last = first.produce()
+    first.last_timestamp += 100
+    assert first.produce() > last
+
+    # 无法续期时，在租约可能过期之前停止生成ID
+    first.renewed_at -= LEASE_TTL / 1000
+    try:
+        first.produce()
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("produce() must stop once the lease may have expired")
+
+    first.close()
+    second.close()
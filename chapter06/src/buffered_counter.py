@@ -0,0 +1,295 @@
+import atexit
+import secrets
+import threading
+
+# 默认每隔多少秒把缓冲区中的增量写入Redis
+DEFAULT_FLUSH_INTERVAL = 1
+# 缓冲区中待写入的计数器数量达到这个值时立即写入
+DEFAULT_MAX_PENDING = 10000
+# Redis不可用时，缓冲区最多保留的计数器数量，是max_pending的倍数
+# 超出之后新出现的计数器的增量将被丢弃并计入dropped，避免内存无限增长
+RETAIN_FACTOR = 10
+# 每个写入脚本最多包含的计数器数量，避免单个脚本阻塞Redis过久
+FLUSH_BATCH_SIZE = 1000
+# 批次标记的存活时间，单位为秒，在此期间重新发送同一批次不会被重复计入
+# 确认写入的批次的标记会被立即删除，只有写入结果未知、进程却在重新发送之前退出时，标记才会留到过期为止
+FLUSH_MARKER_TTL = 3600
+
+# 以批次为单位写入增量：
+# KEYS[1]为批次标记，存在时说明这一批已经写入过，直接返回nil；
+# KEYS[i + 1]为第i个计数器的键，ARGV[1]为标记的存活时间，
+# ARGV[3i - 1]、ARGV[3i]、ARGV[3i + 1]依次为计数器的类型（s为字符串键，h为散列键）、字段以及增量。
+# 单个计数器写入失败（例如键的类型不对）不会影响其他计数器，失败的计数器的序号作为结果返回
+FLUSH_SCRIPT = """
+if not redis.call("SET", KEYS[1], 1, "NX", "EX", ARGV[1]) then
+    return nil
+end
+local failed = {}
+for i = 1, #KEYS - 1 do
+    local result
+    if ARGV[3 * i - 1] == "s" then
+        result = redis.pcall("INCRBY", KEYS[i + 1], ARGV[3 * i + 1])
+    else
+        result = redis.pcall("HINCRBY", KEYS[i + 1], ARGV[3 * i], ARGV[3 * i + 1])
+    end
+    if type(result) == "table" and result.err then
+        table.insert(failed, i)
+    end
+end
+return failed
+"""
+
+
+def make_marker_key(batch_id):
+    """
+    构建记录某个批次已经写入的标记键。
+    例子：CounterBuffer:flushed:5f1c0a9e3b7d4c21
+    """
+    return "CounterBuffer:flushed:{}".format(batch_id)
+
+
+class CounterBuffer:
+
+    def __init__(self, client, flush_interval=DEFAULT_FLUSH_INTERVAL, max_pending=DEFAULT_MAX_PENDING):
+        """
+        创建一个计数器写缓冲区：对同一个计数器的多次增减先在本地合并，
+        然后由后台线程每隔flush_interval秒，或者在待写入的计数器达到max_pending个时，
+        通过脚本成批写入Redis。
+        进程崩溃时会丢失尚未写入的增量：Redis正常时通常只是最近flush_interval秒内的增量，
+        Redis不可用时则是整个不可用期间积累的、最多max_pending * RETAIN_FACTOR个计数器的增量；
+        正常退出时缓冲区会在解释器关闭前自动写入。
+        """
+        self.client = client
+        self.flush_script = client.register_script(FLUSH_SCRIPT)
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        # (键, 字段) -> 尚未写入的增量，字段为None表示字符串键计数器
+        self.pending = {}
+        # 写入结果未知、需要以原有批次ID重新发送的批次：[(批次ID, [((键, 字段), 增量), ...]), ...]
+        self.retries = []
+        # retries中的计数器数量
+        self.retained = 0
+        # 因为缓冲区已满或者写入Redis时出错而被丢弃的增量的数量
+        self.dropped = 0
+        self.lock = threading.Lock()
+        # 保证同一时间只有一个线程在写入，写入结果未知的批次能够按顺序重新发送
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopped = threading.Event()
+        self.flusher = threading.Thread(target=self._run, daemon=True)
+        self.flusher.start()
+        atexit.register(self._close_at_exit)
+
+    def add(self, key, n=1, field=None):
+        """
+        把计数器的增量n记入缓冲区，field不为None时表示散列键key中名为field的计数器。
+        这个方法只修改内存中的数据，不会执行任何网络操作，
+        因此既可以被多个线程同时调用，也可以直接在协程中调用而不会阻塞事件循环。
+        """
+        counter = (key, field)
+        with self.lock:
+            if counter in self.pending:
+                self.pending[counter] += n
+            elif len(self.pending) + self.retained < self.max_pending * RETAIN_FACTOR:
+                self.pending[counter] = n
+            else:
+                self.dropped += abs(n)
+                return
+            if len(self.pending) >= self.max_pending:
+                self.wakeup.set()
+
+    def get_pending(self, key, field=None):
+        """
+        返回给定计数器尚未写入Redis的增量。
+        """
+        with self.lock:
+            return self.pending.get((key, field), 0)
+
+    def flush(self):
+        """
+        立即把缓冲区中的全部增量写入Redis。
+        增量以带有唯一ID的批次为单位通过脚本写入，同一批次最多只会被计入一次：
+        连接中断等导致写入结果未知的批次会以原有的ID在下次写入时重新发送，异常则继续向调用者抛出；
+        无法写入的计数器（例如键中存储的不是整数）的增量会被丢弃并计入dropped，不会被反复重试。
+        """
+        with self.flush_lock:
+            with self.lock:
+                pending, self.pending = self.pending, {}
+            items = [(counter, n) for counter, n in pending.items() if n != 0]
+            batches = self.retries + [
+                (secrets.token_hex(8), items[i:i + FLUSH_BATCH_SIZE]) for i in range(0, len(items), FLUSH_BATCH_SIZE)
+            ]
+            # 已经确认写入的批次不会再被重新发送，它们的标记在写入结束时删除
+            confirmed = []
+            try:
+                for index, (batch_id, chunk) in enumerate(batches):
+                    marker_key = make_marker_key(batch_id)
+                    args = [FLUSH_MARKER_TTL]
+                    for (key, field), n in chunk:
+                        args += ["s", "", n] if field is None else ["h", field, n]
+                    try:
+                        failed = self.flush_script(keys=[marker_key, *(key for (key, _), _ in chunk)], args=args)
+                    except Exception:
+                        with self.lock:
+                            self.retries = batches[index:]
+                            self.retained = sum(len(retry) for _, retry in self.retries)
+                        raise
+                    confirmed.append(marker_key)
+                    if failed:
+                        with self.lock:
+                            self.dropped += sum(abs(chunk[i - 1][1]) for i in failed)
+            finally:
+                if confirmed:
+                    try:
+                        self.client.unlink(*confirmed)
+                    except Exception:
+                        # 删除失败的标记会在FLUSH_MARKER_TTL秒之后自动过期
+                        pass
+            with self.lock:
+                self.retries = []
+                self.retained = 0
+
+    def close(self):
+        """
+        停止后台线程并写入缓冲区中剩余的增量，可以重复调用。
+        """
+        if not self.stopped.is_set():
+            self.stopped.set()
+            self.wakeup.set()
+            self.flusher.join()
+            atexit.unregister(self._close_at_exit)
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _close_at_exit(self):
+        # 解释器退出时Redis可能已经不可用，此时无法写入的增量只能放弃
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def _run(self):
+        while not self.stopped.is_set():
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                # Redis暂时不可用，未写入的批次已经保留下来，等待下次写入
+                pass
+
+
+class BufferedCounter:
+
+    def __init__(self, buffer, key):
+        """
+        创建一个通过写缓冲区更新的计数器，用法与Counter类似，
+        但increase()和decrease()只更新缓冲区，因此不会返回计数器的新值。
+        """
+        self.buffer = buffer
+        self.key = key
+
+    def increase(self, n=1):
+        """
+        将计数器的值加上指定的数字。
+        """
+        self.buffer.add(self.key, n)
+
+    def decrease(self, n=1):
+        """
+        将计数器的值减去指定的数字。
+        """
+        self.buffer.add(self.key, -n)
+
+    def get(self):
+        """
+        返回计数器的当前值，包括尚未写入Redis的增量。
+        """
+        value = self.buffer.client.get(self.key)
+        return (0 if value is None else int(value)) + self.buffer.get_pending(self.key)
+
+
+class BufferedHashCounter:
+
+    def __init__(self, buffer, key, name):
+        """
+        创建一个通过写缓冲区更新的哈希键计数器，参数的含义与HashCounter相同。
+        """
+        self.buffer = buffer
+        self.key = key
+        self.name = name
+
+    def increase(self, n=1):
+        """
+        将计数器的值加上指定的数字。
+        """
+        self.buffer.add(self.key, n, self.name)
+
+    def decrease(self, n=1):
+        """
+        将计数器的值减去指定的数字。
+        """
+        self.buffer.add(self.key, -n, self.name)
+
+    def get(self):
+        """
+        返回计数器的当前值，包括尚未写入Redis的增量。
+        """
+        value = self.buffer.client.hget(self.key, self.name)
+        return (0 if value is None else int(value)) + self.buffer.get_pending(self.key, self.name)
+
+
+if __name__ == '__main__':
+    import os
+    import time
+
+    from redis import Redis
+
+    host = os.getenv("REDIS_HOST") if os.getenv("REDIS_HOST") else "localhost"
+
+    client = Redis(host, decode_responses=True)
+    client.delete("page:10086:views", "User:10086:Counters")
+    for key in client.scan_iter("CounterBuffer:flushed:*"):
+        client.delete(key)
+
+    with CounterBuffer(client, flush_interval=60) as buffer:
+        views = BufferedCounter(buffer, "page:10086:views")
+        logins = BufferedHashCounter(buffer, "User:10086:Counters", "login_counter")
+
+        threads = [
+            threading.Thread(target=lambda: [views.increase() for _ in range(1000)])
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        logins.increase(3)
+        logins.decrease()
+
+        # 增量还在缓冲区中，但get()已经能够看到它们
+        assert client.get("page:10086:views") is None
+        assert views.get() == 8000
+        assert logins.get() == 2
+
+    # 离开with语句时缓冲区被写入Redis
+    assert client.get("page:10086:views") == "8000"
+    assert client.hget("User:10086:Counters", "login_counter") == "2"
+
+    # 无法写入的计数器被丢弃，不会让同一批次中的其他增量被重复计入
+    client.set("page:10087:views", "not a number")
+    with CounterBuffer(client, flush_interval=0.1) as buffer:
+        buffer.add("page:10087:views")
+        views.buffer = buffer
+        views.increase()
+        time.sleep(0.5)
+        assert buffer.dropped == 1
+    assert client.get("page:10086:views") == "8001"
+
+    # 确认写入之后批次标记即被删除，不会在Redis中堆积
+    assert not list(client.scan_iter("CounterBuffer:flushed:*"))
@@ -0,0 +1,40 @@
+import os
+import random
+import time
+
+from redis import Redis
+
+from buffered_counter import BufferedCounter, CounterBuffer
+from counter import Counter
+
+PAGES = 1000
+DURATION = 2
+
+host = os.getenv("REDIS_HOST") if os.getenv("REDIS_HOST") else "localhost"
+client = Redis(host, decode_responses=True)
+
+
+def run(counters):
+    # 模拟页面访问：每个事件随机地为一个页面的访问量加一
+    count = 0
+    deadline = time.monotonic() + DURATION
+    while time.monotonic() < deadline:
+        random.choice(counters).increase()
+        count += 1
+    return count
+
+
+keys = ["Bench:page:{}:views".format(i) for i in range(PAGES)]
+
+client.delete(*keys)
+direct = run([Counter(client, key) for key in keys])
+assert sum(int(client.get(key) or 0) for key in keys) == direct
+
+client.delete(*keys)
+with CounterBuffer(client) as buffer:
+    buffered = run([BufferedCounter(buffer, key) for key in keys])
+assert sum(int(client.get(key) or 0) for key in keys) == buffered
+
+print(f"{'method':>8} {'events/s':>12}")
+print(f"{'direct':>8} {direct / DURATION:>12.0f}")
+print(f"{'buffered':>8} {buffered / DURATION:>12.0f}")
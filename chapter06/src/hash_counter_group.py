@@ -0,0 +1,80 @@
+# 原子地取出多个计数器的旧值，然后把它们全部设置为ARGV[1]
+RESET_SCRIPT = """
+local old_values = redis.call("HMGET", KEYS[1], unpack(ARGV, 2))
+for i = 2, #ARGV do
+    redis.call("HSET", KEYS[1], ARGV[i], ARGV[1])
+end
+return old_values
+"""
+
+
+class HashCounterGroup:
+
+    def __init__(self, client, key):
+        """
+        创建一个计数器组对象，用于一次性读写同一个哈希键中的多个计数器。
+        key参数用于指定包含多个计数器的哈希键的键名，
+        无论涉及多少个计数器，每个操作都只需要一次网络往返。
+        """
+        self.client = client
+        self.key = key
+        self.reset_script = client.register_script(RESET_SCRIPT)
+
+    def increase_many(self, increments):
+        """
+        按照increments给定的名字到数字的映射，为多个计数器加上各自的数字，
+        并返回名字到计数器新值的映射。
+        """
+        tx = self.client.pipeline(transaction=False)
+        for name, n in increments.items():
+            tx.hincrby(self.key, name, n)
+        return dict(zip(increments, tx.execute()))
+
+    def get_many(self, names):
+        """
+        返回名字到计数器当前值的映射，不存在的计数器的值为0。
+        """
+        names = list(names)
+        if not names:
+            return {}
+        values = self.client.hmget(self.key, names)
+        return {name: 0 if value is None else int(value) for name, value in zip(names, values)}
+
+    def get_all(self):
+        """
+        返回哈希键中全部计数器的名字到当前值的映射。
+        """
+        return {name: int(value) for name, value in self.client.hgetall(self.key).items()}
+
+    def reset_many(self, names, n=0):
+        """
+        将多个计数器的值原子地重置为参数n指定的数字，并返回名字到重置之前的旧值的映射。
+        参数n是可选的，若省略则默认将计数器重置为0。
+        """
+        names = list(names)
+        if not names:
+            return {}
+        values = self.reset_script(keys=[self.key], args=[n, *names])
+        return {name: 0 if value is None else int(value) for name, value in zip(names, values)}
+
+
+if __name__ == '__main__':
+    import os
+    from redis import Redis
+
+    host = os.getenv("REDIS_HOST") if os.getenv("REDIS_HOST") else "localhost"
+
+    client = Redis(host, decode_responses=True)
+    client.delete("User:10087:Counters")
+    group = HashCounterGroup(client, "User:10087:Counters")
+
+    assert group.increase_many({"followers": 10, "following": 5, "posts": 1}) == {
+        "followers": 10, "following": 5, "posts": 1,
+    }
+    assert group.increase_many({"followers": -1}) == {"followers": 9}
+
+    assert group.get_many(["followers", "posts", "likes"]) == {"followers": 9, "posts": 1, "likes": 0}
+    assert group.get_all() == {"followers": 9, "following": 5, "posts": 1}
+
+    assert group.reset_many(["followers", "likes"]) == {"followers": 9, "likes": 0}
+    assert group.get_all() == {"followers": 0, "following": 5, "posts": 1, "likes": 0}
@@ -0,0 +1,85 @@
+import random
+import zlib
+
+# 默认的分片数量
+DEFAULT_SHARDS = 8
+
+
+def make_shard_key(key, index):
+    """
+    构建计数器的第index个分片使用的键。
+    整个分片键名都作为散列标签，使得各个分片在集群中被分配到不同的槽，进而分布到不同的节点。
+    例子：{counter1:3}
+    """
+    return "{{{}:{}}}".format(key, index)
+
+
+class ShardedCounter:
+
+    def __init__(self, client, key, shards=DEFAULT_SHARDS):
+        """
+        创建一个分片计数器：计数器的值被分散存储在shards个分片键中，
+        对同一个热点计数器的大量增减操作因此会被分摊到多个键，乃至集群中的多个节点上。
+        client既可以是Redis也可以是RedisCluster。
+        """
+        self.client = client
+        self.key = key
+        self.shards = shards
+        self.shard_keys = [make_shard_key(key, i) for i in range(shards)]
+
+    def increase(self, n=1, client_id=None):
+        """
+        将计数器的值加上指定的数字，并返回被更新的分片的值。
+        给定client_id时，同一个客户端的操作总是落在同一个分片上，否则随机选择分片。
+        """
+        return self.client.incr(self._choose(client_id), n)
+
+    def decrease(self, n=1, client_id=None):
+        """
+        将计数器的值减去指定的数字，并返回被更新的分片的值。
+        """
+        return self.client.decr(self._choose(client_id), n)
+
+    def get(self):
+        """
+        返回计数器的当前值，即全部分片的值之和。
+        """
+        # RedisCluster的mget()要求所有键位于同一个槽，因此改为使用按节点拆分执行的mget_nonatomic()
+        mget = getattr(self.client, "mget_nonatomic", self.client.mget)
+        return sum(int(value) for value in mget(self.shard_keys) if value is not None)
+
+    def reset(self, n=0):
+        """
+        将计数器的值重置为参数n指定的数字，并返回计数器在重置之前的旧值。
+        参数n是可选的，若省略则默认将计数器重置为0。
+        各个分片不会被原子地一起重置，重置期间并发的增减操作仍然会被计入。
+        """
+        tx = self.client.pipeline(transaction=False)
+        for i, shard_key in enumerate(self.shard_keys):
+            tx.set(shard_key, n if i == 0 else 0, get=True)
+        return sum(int(value) for value in tx.execute() if value is not None)
+
+    def _choose(self, client_id):
+        if client_id is None:
+            return random.choice(self.shard_keys)
+        return self.shard_keys[zlib.crc32(str(client_id).encode()) % self.shards]
+
+
+if __name__ == '__main__':
+    import os
+    from redis import Redis
+
+    host = os.getenv("REDIS_HOST") if os.getenv("REDIS_HOST") else "localhost"
+
+    client = Redis(host, decode_responses=True)
+    counter = ShardedCounter(client, 'counter2', shards=4)
+    counter.reset()
+
+    for _ in range(100):
+        counter.increase()
+    counter.increase(100, client_id="user:10086")
+    counter.decrease(50, client_id="user:10086")
+    assert counter.get() == 150
+
+    assert counter.reset() == 150
+    assert counter.get() == 0
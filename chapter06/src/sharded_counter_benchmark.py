@@ -0,0 +1,45 @@
+import os
+import time
+from multiprocessing import Pool
+
+from redis.cluster import RedisCluster
+
+from counter import Counter
+from sharded_counter import ShardedCounter
+
+SHARDS = [1, 2, 4, 8, 16]
+PROCESSES = 8
+DURATION = 2
+
+# 本地的Redis集群，例如使用redis-cli --cluster create创建的三个主节点
+host = os.getenv("REDIS_CLUSTER_HOST") if os.getenv("REDIS_CLUSTER_HOST") else "localhost"
+port = int(os.getenv("REDIS_CLUSTER_PORT") if os.getenv("REDIS_CLUSTER_PORT") else 7000)
+
+
+def make_counter(shards):
+    client = RedisCluster(host=host, port=port, decode_responses=True)
+    if shards == 1:
+        return Counter(client, "{Bench:counter}")
+    return ShardedCounter(client, "Bench:counter", shards)
+
+
+def worker(shards):
+    # 每个进程使用自己的连接不断地为同一个热点计数器加一
+    counter = make_counter(shards)
+    count = 0
+    deadline = time.monotonic() + DURATION
+    while time.monotonic() < deadline:
+        counter.increase()
+        count += 1
+    return count
+
+
+if __name__ == "__main__":
+    print(f"{'shards':>6} {'incr/s':>10}")
+    with Pool(PROCESSES) as pool:
+        for shards in SHARDS:
+            counter = make_counter(shards)
+            counter.reset()
+            total = sum(pool.map(worker, [shards] * PROCESSES))
+            assert counter.get() == total
+            print(f"{shards:>6} {total / DURATION:>10.0f}")
@@ -0,0 +1,154 @@
+import time
+from collections import defaultdict
+
+# 各个粒度的设置：(桶的时长, 每个散列键包含的时长, 桶的保留时长)，单位均为秒
+# 同一个散列键存储一段连续时间内的多个桶，查询一个时间范围通常只需要少数几个HMGET
+GRANULARITIES = {
+    "minute": (60, 3600, 2 * 86400),
+    "hour": (3600, 86400, 30 * 86400),
+    "day": (86400, 30 * 86400, 730 * 86400),
+}
+# 查询时按照从粗到细的顺序使用各个粒度的桶
+QUERY_ORDER = ["day", "hour", "minute"]
+
+
+def make_bucket_key(key, granularity, span_start):
+    """
+    构建存储某个粒度下一段时间内的桶的散列键。
+    例子：User:10086:Logins:minute:1735689600
+    """
+    return "{}:{}:{}".format(key, granularity, span_start)
+
+
+def make_bucket_field(name, bucket_start):
+    """
+    构建桶在散列键中的字段名。
+    例子：login_counter:1735689660
+    """
+    return "{}:{}".format(name, bucket_start)
+
+
+class TimeSeriesCounter:
+
+    def __init__(self, client, key, name):
+        """
+        创建一个按时间分桶的计数器，参数的含义与HashCounter相同。
+        每次增减都会同时更新分钟、小时和天三个粒度的桶，过期的桶由Redis自动删除。
+        """
+        self.client = client
+        self.key = key
+        self.name = name
+
+    def increase(self, n=1, timestamp=None):
+        """
+        将时间戳timestamp所在的各个桶的值加上指定的数字，timestamp默认为当前时间。
+        全部粒度的更新通过一个流水线一次发送。
+        """
+        timestamp = int(time.time() if timestamp is None else timestamp)
+        tx = self.client.pipeline(transaction=False)
+        for granularity, (size, span, retention) in GRANULARITIES.items():
+            span_start = timestamp // span * span
+            bucket_key = make_bucket_key(self.key, granularity, span_start)
+            tx.hincrby(bucket_key, make_bucket_field(self.name, timestamp // size * size), n)
+            # 散列键中最后一个桶也保留足够长的时间之后，整个散列键才会过期
+            tx.expireat(bucket_key, span_start + span + retention)
+        tx.execute()
+
+    def decrease(self, n=1, timestamp=None):
+        """
+        将时间戳timestamp所在的各个桶的值减去指定的数字。
+        """
+        self.increase(0 - n, timestamp)
+
+    def get(self, start, end=None):
+        """
+        返回[start, end)时间范围内的计数之和，end默认为当前时间。
+        范围的两端会按分钟对齐：start向下取整，end向上取整，因此包含end所在的那一分钟。
+        范围内完整的天和小时直接使用粗粒度的桶，只有两端不足一小时的部分才使用分钟桶，
+        细粒度的桶超过保留时长被删除之后，范围中较早的一端会向外扩展到完整的小时或者天。
+        所有桶按照散列键分组，通过一个流水线中的少数几个HMGET一次取得。
+        """
+        end = time.time() if end is None else end
+        minute = GRANULARITIES["minute"][0]
+        start = int(start) // minute * minute
+        end = -(-int(end) // minute) * minute
+        fields = defaultdict(list)
+        for granularity, bucket_start in self._plan(start, end, 0, time.time()):
+            span = GRANULARITIES[granularity][1]
+            bucket_key = make_bucket_key(self.key, granularity, bucket_start // span * span)
+            fields[bucket_key].append(make_bucket_field(self.name, bucket_start))
+        if not fields:
+            return 0
+        tx = self.client.pipeline(transaction=False)
+        for bucket_key, names in fields.items():
+            tx.hmget(bucket_key, names)
+        return sum(int(value) for values in tx.execute() for value in values if value is not None)
+
+    def last(self, seconds):
+        """
+        返回最近seconds秒内的计数之和。
+        """
+        now = time.time()
+        return self.get(now - seconds, now)
+
+    def _plan(self, start, end, level, now):
+        # 把[start, end)拆分为尽可能少的桶：先取出完整的粗粒度桶，再用更细的粒度覆盖两端
+        # 细粒度的桶已经过期时，改为使用与这一端重叠的全部完整粗粒度桶
+        if start >= end:
+            return []
+        granularity = QUERY_ORDER[level]
+        size = GRANULARITIES[granularity][0]
+        if level == len(QUERY_ORDER) - 1:
+            return [(granularity, bucket) for bucket in range(start, end, size)]
+        retained = now - GRANULARITIES[QUERY_ORDER[level + 1]][2]
+        first = -(-start // size) * size
+        last = end // size * size
+        if first >= last:
+            if start >= retained:
+                return self._plan(start, end, level + 1, now)
+            # 范围可能跨越一个粗粒度桶的边界，此时需要边界两侧的两个桶
+            return [(granularity, bucket) for bucket in range(start // size * size, end, size)]
+        if start >= retained:
+            head = self._plan(start, first, level + 1, now)
+        else:
+            head = [(granularity, bucket) for bucket in range(start // size * size, first, size)]
+        if last >= retained:
+            tail = self._plan(last, end, level + 1, now)
+        else:
+            tail = [(granularity, bucket) for bucket in range(last, end, size)]
+        return head + [(granularity, bucket) for bucket in range(first, last, size)] + tail
+
+
+if __name__ == '__main__':
+    import os
+    from redis import Redis
+
+    host = os.getenv("REDIS_HOST") if os.getenv("REDIS_HOST") else "localhost"
+
+    client = Redis(host, decode_responses=True)
+    for key in client.scan_iter("User:10086:Logins:*"):
+        client.delete(key)
+
+    counter = TimeSeriesCounter(client, "User:10086:Logins", "login_counter")
+
+    now = int(time.time())
+    counter.increase(timestamp=now)
+    counter.increase(2, timestamp=now - 10 * 60)
+    counter.increase(4, timestamp=now - 3 * 3600)
+    counter.increase(8, timestamp=now - 3 * 86400)
+    counter.decrease(timestamp=now - 10 * 60)
+
+    assert counter.last(60) == 1
+    assert counter.last(15 * 60) == 2
+    assert counter.last(86400) == 6
+    assert counter.last(7 * 86400) == 14
+    assert counter.get(now - 4 * 86400, now - 2 * 86400) == 8
+
+    # 分钟桶已经过期的时间范围会向外扩展到完整的小时
+    # 使用按小时对齐的时间，确保结果与运行demo的时刻无关
+    hour = (now - 10 * 86400) // 3600 * 3600
+    counter.increase(16, timestamp=hour - 30 * 60)
+    counter.increase(32, timestamp=hour + 30)
+    assert counter.get(hour - 30 * 60 - 60, hour - 30 * 60 + 60) == 16
+    # 跨越小时边界的范围同时包含边界两侧的两个小时
+    assert counter.get(hour - 60, hour + 60) == 48
@@ -11,12 +11,23 @@ class HllUniqueCounter:
         """
         return self.client.pfadd(self.key, item) == 1
 
+    def include_many(self, items):
+        """
+        通过一个PFADD命令对多个元素进行计数。
+        如果计数器的估算值因此发生了变化，那么返回True，否则返回False。
+        """
+        items = list(items)
+        if not items:
+            return False
+        return self.client.pfadd(self.key, *items) == 1
+
     def exclude(self, item):
         """
         尝试将被计数的元素移出计数器。
         移除成功返回True，因元素尚未被计数而导致移除失败则返回False。
+        HLL无法移除单个元素，需要让元素随时间过期时请使用WindowedHllUniqueCounter。
         """
-        raise NotImplementedError
+        raise NotImplementedError("HyperLogLog cannot remove items, use WindowedHllUniqueCounter")
 
     def count(self):
         """
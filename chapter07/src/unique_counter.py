@@ -11,6 +11,15 @@ class UniqueCounter:
         """
         return self.client.sadd(self.key, item) == 1
 
+    def include_many(self, items):
+        """
+        通过一个SADD命令对多个元素进行计数，返回其中之前没有被计数过的元素的数量。
+        """
+        items = list(items)
+        if not items:
+            return 0
+        return self.client.sadd(self.key, *items)
+
     def exclude(self, item):
         """
         尝试将被计数的元素移出计数器。
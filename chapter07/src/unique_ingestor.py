@@ -0,0 +1,237 @@
+import atexit
+import math
+import queue
+import threading
+
+from redis import ResponseError
+
+# 默认每批最多包含的元素数量，每批通过一个SADD/PFADD发送
+DEFAULT_BATCH_SIZE = 1000
+# 默认每隔多少秒把尚未凑满一批的元素发送出去
+DEFAULT_FLUSH_INTERVAL = 1
+# 等待发送的批次的最大数量，队列已满时add()会阻塞，直到后台线程赶上为止
+DEFAULT_MAX_BATCHES = 16
+# 发送失败时对同一批次的最大重试次数，每次重试之间间隔flush_interval秒，
+# 超出之后这一批被丢弃并计入dropped，避免Redis长时间不可用时flush()和close()无限期地等待
+MAX_SEND_RETRIES = 5
+
+
+class LocalBloomFilter:
+
+    def __init__(self, capacity, error_rate):
+        """
+        创建一个位于进程内存中的布隆过滤器。
+        capacity为预计加入的元素数量，error_rate为达到这个数量时的误判率。
+        加入的元素达到capacity个之后过滤器会被清空，避免误判率随着元素的增加而失控。
+        """
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.clear()
+
+    def clear(self):
+        """
+        清空过滤器中的全部元素。
+        """
+        self.bits = bytearray((self.size + 7) // 8)
+        # 自上次清空以来加入的元素数量
+        self.count = 0
+
+    def add(self, item):
+        """
+        把元素加入过滤器。元素可能已经存在时返回False，否则返回True。
+        """
+        if self.count >= self.capacity:
+            self.clear()
+        # 双重散列：用两个散列值组合出全部位置
+        # 过滤器只在进程内部使用，因此可以直接使用Python内置的hash()
+        first = hash(item)
+        second = hash((item, self.size)) | 1
+        bits = self.bits
+        present = True
+        for i in range(self.hashes):
+            position = (first + i * second) % self.size
+            mask = 1 << (position & 7)
+            if not bits[position >> 3] & mask:
+                present = False
+                bits[position >> 3] |= mask
+        if not present:
+            self.count += 1
+        return not present
+
+
+class UniqueIngestor:
+
+    def __init__(
+        self,
+        counter,
+        batch_size=DEFAULT_BATCH_SIZE,
+        flush_interval=DEFAULT_FLUSH_INTERVAL,
+        max_batches=DEFAULT_MAX_BATCHES,
+        bloom_capacity=None,
+        bloom_error_rate=0.001,
+    ):
+        """
+        为UniqueCounter或者HllUniqueCounter创建一个批量写入器。
+        元素先在本地去重并凑成批次，再由后台线程通过counter.include_many()一次发送一批。
+        给定bloom_capacity时，写入器会使用本地布隆过滤器丢弃已经发送过的元素，
+        重复元素较多的事件流因此几乎不会产生网络流量；
+        但是过滤器的误判会让少量从未出现的元素被当作重复丢弃，比例约为bloom_error_rate，
+        因此它更适合本来就是估算的HllUniqueCounter。
+        过滤器每记录bloom_capacity个元素就会被清空，批次发送失败而被丢弃时也会被清空，
+        此后之前出现过的元素会被再次发送，这对于SADD/PFADD来说是无害的。
+        """
+        self.counter = counter
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.bloom = None if bloom_capacity is None else LocalBloomFilter(bloom_capacity, bloom_error_rate)
+        # 当前正在凑的批次，使用字典在保持顺序的同时去除批次内的重复元素
+        self.pending = {}
+        # 被布隆过滤器或批次内去重丢弃的元素数量
+        self.skipped = 0
+        # 因为发送失败而被丢弃的元素数量
+        self.dropped = 0
+        self.lock = threading.Lock()
+        # 后台线程发送定时取出的批次时持有这个锁，flush()借此等待这些不经过队列的批次
+        self.send_lock = threading.Lock()
+        self.batches = queue.Queue(max_batches)
+        # closing被设置之后，发送失败的批次不再重试，stopped被设置之后后台线程退出
+        self.closing = threading.Event()
+        self.stopped = threading.Event()
+        self.flusher = threading.Thread(target=self._run, daemon=True)
+        self.flusher.start()
+        atexit.register(self.close)
+
+    def add(self, item):
+        """
+        把元素加入写入器。
+        待发送的批次过多时这个方法会阻塞，从而让生产者的速度与Redis的写入速度相匹配。
+        """
+        with self.lock:
+            if item in self.pending or (self.bloom is not None and not self.bloom.add(item)):
+                self.skipped += 1
+                return
+            self.pending[item] = None
+            if len(self.pending) < self.batch_size:
+                return
+            batch, self.pending = self.pending, {}
+        self.batches.put(list(batch))
+
+    def add_many(self, items):
+        """
+        把多个元素加入写入器。
+        """
+        for item in items:
+            self.add(item)
+
+    def flush(self):
+        """
+        把当前尚未凑满的批次交给后台线程，并等待全部批次发送完毕或者被丢弃。
+        """
+        with self.lock:
+            batch, self.pending = self.pending, {}
+        if batch:
+            self.batches.put(list(batch))
+        self.batches.join()
+        with self.send_lock:
+            pass
+
+    def close(self):
+        """
+        发送剩余的全部元素并停止后台线程，可以重复调用。
+        关闭时每个剩余批次只尝试发送一次，Redis不可用时这些元素会被丢弃并计入dropped。
+        """
+        if self.stopped.is_set():
+            return
+        self.closing.set()
+        self.flush()
+        self.stopped.set()
+        self.flusher.join()
+        atexit.unregister(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _run(self):
+        while not self.stopped.is_set():
+            try:
+                batch = self.batches.get(timeout=self.flush_interval)
+            except queue.Empty:
+                # 一段时间内没有凑满的批次，把当前批次发送出去，避免元素长时间滞留在本地
+                # 批次不经过队列（队列已满时放入队列会让后台线程等待自己），因此发送期间持有send_lock
+                with self.send_lock:
+                    with self.lock:
+                        batch, self.pending = list(self.pending), {}
+                    if batch:
+                        self._send(batch)
+                continue
+            try:
+                self._send(batch)
+            finally:
+                self.batches.task_done()
+
+    def _send(self, batch):
+        for retries in range(MAX_SEND_RETRIES + 1):
+            try:
+                self.counter.include_many(batch)
+                return
+            except ResponseError:
+                # 命令本身被拒绝（例如键的类型不对），重试也不会成功
+                break
+            except Exception:
+                # Redis暂时不可用：稍后重试同一批次，队列随之积压并通过add()对生产者施加背压
+                if retries == MAX_SEND_RETRIES or self.closing.wait(self.flush_interval):
+                    break
+        with self.lock:
+            self.dropped += len(batch)
+            if self.bloom is not None:
+                # 被丢弃的元素已经记录在过滤器中，清空过滤器才能让它们在再次出现时被重新发送
+                self.bloom.clear()
+
+
+if __name__ == '__main__':
+    import os
+    import time
+
+    from redis import Redis
+
+    from hll_unique_counter import HllUniqueCounter
+    from unique_counter import UniqueCounter
+
+    host = os.getenv("REDIS_HOST") if os.getenv("REDIS_HOST") else "localhost"
+
+    client = Redis(host=host)
+    client.delete("VisitCounter:batched", "HllVisitorCounter:batched")
+    client.set("HllVisitorCounter:broken", "not a HyperLogLog")
+
+    visitors = ["user:{}".format(i % 1000) for i in range(20000)]
+
+    with UniqueIngestor(UniqueCounter(client, "VisitCounter:batched"), batch_size=100) as ingestor:
+        ingestor.add_many(visitors)
+    assert client.scard("VisitCounter:batched") == 1000
+
+    hll = HllUniqueCounter(client, "HllVisitorCounter:batched")
+    with UniqueIngestor(hll, bloom_capacity=10000) as ingestor:
+        ingestor.add_many(visitors)
+        # 第一轮之后的重复元素全部被布隆过滤器丢弃
+        assert ingestor.skipped >= 19000
+    assert abs(hll.count() - 1000) < 20
+
+    # flush()同样会等待后台线程定时取出的批次发送完毕
+    with UniqueIngestor(UniqueCounter(client, "VisitCounter:batched"), flush_interval=0.1) as ingestor:
+        ingestor.add("Peter")
+        time.sleep(0.1)
+        ingestor.flush()
+        assert client.sismember("VisitCounter:batched", "Peter")
+
+    # 元素数量超过容量之后过滤器被清空，而不是把几乎所有新元素都当作重复
+    bloom = LocalBloomFilter(1000, 0.001)
+    assert sum(bloom.add("item:{}".format(i)) for i in range(100000)) > 99000
+
+    # 被Redis拒绝的批次不会被反复重试，关闭写入器也不会因此卡住
+    with UniqueIngestor(HllUniqueCounter(client, "HllVisitorCounter:broken"), batch_size=100) as ingestor:
+        ingestor.add_many(visitors)
+    assert ingestor.dropped == len(visitors)
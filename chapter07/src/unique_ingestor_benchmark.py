@@ -0,0 +1,46 @@
+import os
+import random
+import time
+
+from redis import Redis
+
+from hll_unique_counter import HllUniqueCounter
+from unique_counter import UniqueCounter
+from unique_ingestor import UniqueIngestor
+
+EVENTS = 200000
+# 事件流中不同元素的数量，重复率约为1 - DISTINCT / EVENTS
+DISTINCT = [100000, 20000, 2000]
+
+host = os.getenv("REDIS_HOST") if os.getenv("REDIS_HOST") else "localhost"
+client = Redis(host=host)
+
+
+def direct(counter, events):
+    for event in events:
+        counter.include(event)
+
+
+def batched(counter, events, **options):
+    with UniqueIngestor(counter, **options) as ingestor:
+        ingestor.add_many(events)
+
+
+def measure(name, run, counter, events, **options):
+    client.delete(counter.key)
+    start = time.perf_counter()
+    run(counter, events, **options)
+    elapsed = time.perf_counter() - start
+    print(f"{name:>22} {len(events) / elapsed:>12.0f} {counter.count():>9}")
+
+
+for distinct in DISTINCT:
+    events = ["user:{}".format(random.randrange(distinct)) for _ in range(EVENTS)]
+    print(f"distinct={distinct} duplicate ratio={1 - len(set(events)) / EVENTS:.0%}")
+    print(f"{'method':>22} {'items/s':>12} {'count':>9}")
+    measure("SADD", direct, UniqueCounter(client, "Bench:Unique"), events)
+    measure("batched SADD", batched, UniqueCounter(client, "Bench:Unique"), events)
+    measure("PFADD", direct, HllUniqueCounter(client, "Bench:Hll"), events)
+    measure("batched PFADD", batched, HllUniqueCounter(client, "Bench:Hll"), events)
+    measure("batched PFADD + bloom", batched, HllUniqueCounter(client, "Bench:Hll"), events,
+            bloom_capacity=distinct)
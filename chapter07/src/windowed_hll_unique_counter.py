@@ -0,0 +1,165 @@
+import time
+from collections import OrderedDict
+
+# 默认每个桶覆盖的时长，单位为秒
+DEFAULT_BUCKET_SECONDS = 60
+# 默认每多少个桶预先合并为一个汇总HLL
+DEFAULT_ROLLUP_BUCKETS = 60
+# 默认能够查询的最长时间窗口，单位为秒，超出这个时长的桶和汇总会被自动删除
+DEFAULT_RETENTION = 7 * 86400
+# 本地缓存的查询结果的最大数量以及有效时长，单位为秒
+CACHE_SIZE = 128
+CACHE_TTL = 1
+
+
+def make_bucket_key(key, bucket_start):
+    """
+    构建存储某个时间桶内元素的HLL键。
+    例子：HllVisitorCounter:bucket:1735689660
+    """
+    return "{}:bucket:{}".format(key, bucket_start)
+
+
+def make_rollup_key(key, rollup_start):
+    """
+    构建存储多个时间桶合并结果的HLL键。
+    例子：HllVisitorCounter:rollup:1735689600
+    """
+    return "{}:rollup:{}".format(key, rollup_start)
+
+
+class WindowedHllUniqueCounter:
+
+    def __init__(
+        self,
+        client,
+        key,
+        bucket_seconds=DEFAULT_BUCKET_SECONDS,
+        rollup_buckets=DEFAULT_ROLLUP_BUCKETS,
+        retention=DEFAULT_RETENTION,
+    ):
+        """
+        创建一个基于时间窗口的HLL计数器：每个时间桶使用一个HLL，
+        查询时对窗口内的全部HLL执行PFCOUNT，元素离开窗口即不再被计数，
+        而过期的桶会被Redis自动删除，因此内存占用只取决于retention而不会随时间增长。
+        已经结束的每rollup_buckets个桶会在首次查询时被预先合并为一个汇总HLL，
+        查询很长的时间窗口时，只有窗口两端不完整的部分才需要逐个桶计算。
+        """
+        self.client = client
+        self.key = key
+        self.bucket_seconds = bucket_seconds
+        self.rollup_seconds = bucket_seconds * rollup_buckets
+        self.retention = retention
+        # 已经确认存在的汇总HLL的起始时间
+        self.rollups = set()
+        # (窗口起点, 窗口终点) -> (结果, 过期时间)
+        self.cache = OrderedDict()
+
+    def include(self, item, timestamp=None):
+        """
+        对给定元素进行计数，timestamp为元素出现的时间，默认为当前时间。
+        如果元素在所属的时间桶中之前没有被计数过，那么返回True，否则返回False。
+        """
+        return self.include_many([item], timestamp)
+
+    def include_many(self, items, timestamp=None):
+        """
+        通过一个PFADD命令对同一时间出现的多个元素进行计数。
+        如果所属时间桶的估算值因此发生了变化，那么返回True，否则返回False。
+        """
+        items = list(items)
+        if not items:
+            return False
+        timestamp = int(time.time() if timestamp is None else timestamp)
+        bucket_start = timestamp // self.bucket_seconds * self.bucket_seconds
+        bucket_key = make_bucket_key(self.key, bucket_start)
+        tx = self.client.pipeline(transaction=False)
+        tx.pfadd(bucket_key, *items)
+        tx.expireat(bucket_key, bucket_start + self.bucket_seconds + self.retention)
+        changed, _ = tx.execute()
+        return changed == 1
+
+    def count(self, window, now=None):
+        """
+        返回最近window秒内出现过的不同元素的数量估算值，now默认为当前时间。
+        窗口的两端按桶对齐，因此包含now所在的那个尚未结束的桶。
+        """
+        now = int(time.time() if now is None else now)
+        end = (now // self.bucket_seconds + 1) * self.bucket_seconds
+        start = max(end - window, now - self.retention) // self.bucket_seconds * self.bucket_seconds
+        cached = self.cache.get((start, end))
+        if cached is not None and cached[1] > time.monotonic():
+            self.cache.move_to_end((start, end))
+            return cached[0]
+
+        # 窗口内完整且已经结束的汇总周期使用汇总HLL，其余部分逐个使用桶HLL
+        first = -(-start // self.rollup_seconds) * self.rollup_seconds
+        last = min(end, now) // self.rollup_seconds * self.rollup_seconds
+        rollup_starts = list(range(first, last, self.rollup_seconds))
+        if rollup_starts:
+            buckets = list(range(start, first, self.bucket_seconds))
+            buckets += range(last, end, self.bucket_seconds)
+        else:
+            buckets = list(range(start, end, self.bucket_seconds))
+        self._ensure_rollups(rollup_starts)
+        keys = [make_rollup_key(self.key, rollup_start) for rollup_start in rollup_starts]
+        keys += [make_bucket_key(self.key, bucket) for bucket in buckets]
+        result = self.client.pfcount(*keys)
+
+        self.cache[(start, end)] = (result, time.monotonic() + CACHE_TTL)
+        self.cache.move_to_end((start, end))
+        if len(self.cache) > CACHE_SIZE:
+            self.cache.popitem(last=False)
+        return result
+
+    def _ensure_rollups(self, rollup_starts):
+        # 汇总周期已经结束，桶不会再变化，因此合并一次之后就可以一直使用
+        # 带有过去时间戳的迟到元素不会被计入已经生成的汇总
+        missing = [rollup_start for rollup_start in rollup_starts if rollup_start not in self.rollups]
+        if not missing:
+            return
+        tx = self.client.pipeline(transaction=False)
+        for rollup_start in missing:
+            rollup_key = make_rollup_key(self.key, rollup_start)
+            bucket_keys = [
+                make_bucket_key(self.key, bucket)
+                for bucket in range(rollup_start, rollup_start + self.rollup_seconds, self.bucket_seconds)
+            ]
+            tx.pfmerge(rollup_key, *bucket_keys)
+            tx.expireat(rollup_key, rollup_start + self.rollup_seconds + self.retention)
+        tx.execute()
+        self.rollups.update(missing)
+
+
+if __name__ == '__main__':
+    import os
+    from redis import Redis
+
+    host = os.getenv("REDIS_HOST") if os.getenv("REDIS_HOST") else "localhost"
+
+    client = Redis(host=host)
+    for key in client.scan_iter("HllVisitorWindow:*"):
+        client.delete(key)
+
+    c = WindowedHllUniqueCounter(client, "HllVisitorWindow")
+    now = int(time.time())
+
+    # 过去24小时内每分钟都有访客，其中一半是每分钟都会出现的老访客
+    for minute in range(24 * 60):
+        timestamp = now - minute * 60
+        c.include_many(["regular:{}".format(i) for i in range(50)], timestamp)
+        c.include_many(["visitor:{}:{}".format(minute, i) for i in range(2)], timestamp)
+
+    assert c.include("Peter", now)
+    assert not c.include("Peter", now)
+
+    assert abs(c.count(60, now) - 53) <= 1
+    assert abs(c.count(3600, now) - (50 + 2 * 60 + 1)) <= 3
+    day = c.count(86400, now)
+    assert abs(day - (50 + 2 * 24 * 60 + 1)) < 50
+    # 结果被缓存，汇总HLL也只生成一次
+    assert c.count(86400, now) == day
+    assert len(c.rollups) >= 23
+
+    # 离开窗口的访客不再被计数
+    assert abs(c.count(3600, now + 86400) - 0) <= 1